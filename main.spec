@@ -1,11 +1,22 @@
 # -*- mode: python ; coding: utf-8 -*-
+import sys
+sys.path.insert(0, 'src')
+from lib.EmojiAtlas import EmojiAtlas
 
+# Emojis are bundled as one packed atlas instead of separate pngs
+EmojiAtlas.pack()
 
 a = Analysis(
     ['src/main.py'],
     pathex=[],
     binaries=[],
-    datas=[('assets', 'assets')],
+    datas=[
+        ('assets/css', 'assets/css'),
+        ('assets/html', 'assets/html'),
+        ('assets/js', 'assets/js'),
+        ('assets/emojis.atlas', 'assets'),
+        ('assets/emojis.json', 'assets'),
+    ],
     hiddenimports=['numpy'],
     hookspath=[],
     hooksconfig={},
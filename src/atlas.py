@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+import time
+from pathlib import Path
+from argparse import ArgumentParser
+from lib.EmojiAtlas import EmojiAtlas, EMOJIS_PATH, ATLAS_PATH, ATLAS_INDEX_PATH
+
+def main() -> None:
+    parser = ArgumentParser("Packs emoji images into one atlas with an index")
+    parser.add_argument("-i", "--input", type=Path, default=EMOJIS_PATH, help="directory with emoji pngs")
+    parser.add_argument("-o", "--output", type=Path, default=ATLAS_PATH, help="atlas pixels file")
+    parser.add_argument("-x", "--index", type=Path, default=ATLAS_INDEX_PATH, help="atlas index file")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    atlas = EmojiAtlas.pack(args.input, args.output, args.index)
+    print("[INFO]: Packed {} emojis into {}x{} atlas in {:.2f}s".format(
+        len(atlas), atlas.image.width(), atlas.image.height(), time.perf_counter() - start
+    ))
+    print("[INFO]: Atlas: {} ({:.1f} KiB)".format(args.output, args.output.stat().st_size / 1024))
+    print("[INFO]: Index: {} ({:.1f} KiB)".format(args.index, args.index.stat().st_size / 1024))
+
+if __name__ == "__main__":
+    main()
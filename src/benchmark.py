@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+import gc
+import os
+import sys
+import time
+import skia
+import tempfile
+import tracemalloc
+from collections import Counter
+from argparse import ArgumentParser
+from lib.Layout import DocumentLayout, Dimensions
+from lib.CSSParser import CSSParser, style, cascade_priority
+from lib.HTMLParser import HTMLParser
+from lib.Draw import Draw, LAYER_CACHE, record
+from lib.TileCache import TileCache
+from lib.Tab import DEFAULT_STYLE_SHEET, tree_to_list, paint_tree
+
+DIMENSIONS = Dimensions(width=800, height=600, hstep=13, vstep=18)
+
+def generate_page(paragraphs: int) -> str:
+    body = ""
+    for i in range(paragraphs):
+        body += "<h2 id=\"section-{}\">Section {}</h2>".format(i, i)
+        body += "<p>" + "Lorem ipsum <b>dolor</b> sit amet, <i>consectetur</i> adipiscing elit. " * 4 + "</p>"
+        body += "<ul><li>First item</li><li>Second <a href=\"#section-0\">item</a></li></ul>"
+    return "<html><head><title>Benchmark</title></head><body>{}</body></html>".format(body)
+
+def measure(fn) -> tuple[int, object]:
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+def bench_memory(paragraphs: int) -> None:
+    html = generate_page(paragraphs)
+    rules = sorted(DEFAULT_STYLE_SHEET, key=cascade_priority)
+    def build_dom():
+        nodes = HTMLParser(html).parse()
+        style(nodes, rules)
+        return nodes
+    dom_size, nodes = measure(build_dom)
+    def build_layout():
+        document = DocumentLayout(nodes, DIMENSIONS) # type: ignore
+        document.layout()
+        return document
+    layout_size, document = measure(build_layout)
+    # Summary
+    dom_count = len(tree_to_list(nodes, []))
+    layouts = tree_to_list(document, [])
+    print("[INFO]: DOM: {} nodes, {:.1f} KiB ({:.0f} B/node)".format(
+        dom_count, dom_size / 1024, dom_size / dom_count
+    ))
+    print("[INFO]: Layout: {} objects, {:.1f} KiB ({:.0f} B/object)".format(
+        len(layouts), layout_size / 1024, layout_size / len(layouts)
+    ))
+    print("[INFO]: Layout/DOM memory ratio: {:.2f}".format(layout_size / dom_size))
+    for name, count in Counter(type(obj).__name__ for obj in layouts).most_common():
+        sample = next(obj for obj in layouts if type(obj).__name__ == name)
+        size = sys.getsizeof(sample)
+        if hasattr(sample, "__dict__"): size += sys.getsizeof(sample.__dict__)
+        print("[INFO]:   {:<15} x{:<7} {} B/instance".format(name, count, size))
+
+def bench_raster(paragraphs: int, pool_sizes: list[int], repeat: int) -> None:
+    nodes = HTMLParser(generate_page(paragraphs)).parse()
+    style(nodes, sorted(DEFAULT_STYLE_SHEET, key=cascade_priority))
+    document = DocumentLayout(nodes, DIMENSIONS)
+    document.layout()
+    display_list: list[Draw] = []
+    paint_tree(document, display_list)
+    bounds = skia.Rect.MakeWH(DIMENSIONS["width"], document.height)
+    picture = record(display_list, bounds)
+    def paint(canvas: skia.Canvas) -> None:
+        canvas.drawPicture(picture)
+    print("[INFO]: Document: {}x{} px".format(DIMENSIONS["width"], document.height))
+    for threads in pool_sizes:
+        best = 0.0
+        for _ in range(repeat):
+            cache = TileCache(budget=sys.maxsize, threads=threads)
+            start = time.perf_counter()
+            cache.raster(paint, bounds, bounds)
+            elapsed = time.perf_counter() - start
+            best = max(best, len(cache) / elapsed)
+            cache.close()
+        print("[INFO]:   {:>2} threads: {:8.1f} tiles/s".format(threads, best))
+
+def bench_layers(paragraphs: int) -> None:
+    html = generate_page(paragraphs)
+    def record_page(opacity: float) -> float:
+        nodes = HTMLParser(html).parse()
+        sheet = CSSParser("p {{ opacity: {}; }} ul {{ filter: blur(1px); }}".format(opacity)).parse()
+        style(nodes, sorted(DEFAULT_STYLE_SHEET + sheet, key=cascade_priority))
+        document = DocumentLayout(nodes, DIMENSIONS)
+        document.layout()
+        display_list: list[Draw] = []
+        paint_tree(document, display_list)
+        start = time.perf_counter()
+        record(display_list, skia.Rect.MakeWH(DIMENSIONS["width"], document.height))
+        return time.perf_counter() - start
+    for name, opacity in [("cold", 0.5), ("warm", 0.5), ("opacity", 0.8)]:
+        LAYER_CACHE.reset_counters()
+        elapsed = record_page(opacity)
+        print("[INFO]: {:<8} {:8.1f} ms, {} hits, {} misses, {} layers ({:.1f} MiB)".format(
+            name, elapsed * 1000, LAYER_CACHE.hits, LAYER_CACHE.misses, 
+            len(LAYER_CACHE), LAYER_CACHE.size() / 1024 / 1024
+        ))
+
+def wait_for_tab(browser) -> None:
+    # Tab loads and lays out on its own thread, rendering schedules one more task
+    import threading
+    for _ in range(2):
+        done = threading.Event()
+        browser.active_tab.schedule_task(done.set)
+        done.wait()
+    browser.frame()
+
+def bench_frames(paragraphs: int, frames: int) -> None:
+    # Window is kept in memory, unless other video driver is set
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import sdl2
+    from lib.URL import URL
+    from lib.Browser import Browser
+    sdl2.SDL_Init(sdl2.SDL_INIT_VIDEO | sdl2.SDL_INIT_EVENTS)
+    with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False) as file:
+        file.write(generate_page(paragraphs))
+    browser = Browser()
+    browser.new_tab(URL("file://" + file.name))
+    browser.frame()
+    wait_for_tab(browser)
+    for name, (width, height) in [("1080p", (1920, 1080)), ("4K", (3840, 2160))]:
+        sdl2.SDL_SetWindowSize(browser.sdl_window, width, height)
+        browser.handle_configure(width, height)
+        browser.frame()
+        wait_for_tab(browser)
+        for direct in [True, False]:
+            browser.make_root_surface(direct)
+            browser.draw()
+            start = time.perf_counter()
+            for _ in range(frames):
+                browser.damage_all()
+                browser.draw()
+            elapsed = time.perf_counter() - start
+            print("[INFO]: {:<6} {:<7} {:8.1f} frames/s".format(
+                name, "direct" if browser.root_sdl_surface is None else "blit", frames / elapsed
+            ))
+    browser.handle_quit()
+    os.unlink(file.name)
+
+def bench_connections(requests: int, concurrent: bool) -> None:
+    # Local keep-alive server, so only connection setup and parsing are measured
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from lib.URL import URL, CONNECTION_POOL
+    body = generate_page(10).encode()
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately, so Nagle would delay every response
+        disable_nagle_algorithm = True
+        def log_message(self, *args) -> None:
+            pass
+        def do_GET(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = URL("http://127.0.0.1:{}/".format(server.server_address[1]))
+    start = time.perf_counter()
+    # New url for every request, same as links and subresources
+    urls = [base.resolve("/page{}".format(i)) for i in range(requests)]
+    if concurrent:
+        # All requests are in flight at once on network loop, without thread for each
+        futures = [url.request_future(base) for url in urls]
+        for future in futures: future.result()
+    else:
+        for url in urls: url.request(base)
+    elapsed = time.perf_counter() - start
+    stats = CONNECTION_POOL.stats()
+    print("[INFO]: {} requests: {:8.1f} requests/s".format(requests, requests / elapsed))
+    print("[INFO]: Reused {} of {} connections ({:.0%}), {} idle".format(
+        stats["reused"], stats["requests"], stats["reuse_rate"], stats["idle"]
+    ))
+    server.shutdown()
+
+def main() -> None:
+    parser = ArgumentParser("Benchmarks for browser internals")
+    commands = parser.add_subparsers(dest="command", required=True)
+    memory = commands.add_parser("memory", help="measure layout tree memory against the DOM")
+    memory.add_argument("-n", "--paragraphs", type=int, default=500, help="number of generated sections")
+    raster = commands.add_parser("raster", help="measure tile raster throughput against thread pool size")
+    raster.add_argument("-n", "--paragraphs", type=int, default=200, help="number of generated sections")
+    raster.add_argument("-t", "--threads", type=int, nargs="+", default=[1, 2, 4, 8], help="thread pool sizes")
+    raster.add_argument("-r", "--repeat", type=int, default=3, help="runs per pool size, best is reported")
+    layers = commands.add_parser("layers", help="measure effect layer cache against changed opacity")
+    layers.add_argument("-n", "--paragraphs", type=int, default=100, help="number of generated sections")
+    frames = commands.add_parser("frames", help="measure full frame composite and present at 1080p and 4K")
+    frames.add_argument("-n", "--paragraphs", type=int, default=100, help="number of generated sections")
+    frames.add_argument("-f", "--frames", type=int, default=100, help="frames per measurement")
+    connections = commands.add_parser("connections", help="measure request throughput and keep-alive connection reuse")
+    connections.add_argument("-n", "--requests", type=int, default=200, help="number of requests")
+    connections.add_argument("-c", "--concurrent", action="store_true", help="submit all requests at once")
+    args = parser.parse_args()
+    match args.command:
+        case "memory":
+            bench_memory(args.paragraphs)
+        case "raster":
+            bench_raster(args.paragraphs, args.threads, args.repeat)
+        case "layers":
+            bench_layers(args.paragraphs)
+        case "frames":
+            bench_frames(args.paragraphs, args.frames)
+        case "connections":
+            bench_connections(args.requests, args.concurrent)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import zlib
+import codecs
+from typing import AsyncIterator, Iterator
+from .ConnectionPool import Connection
+
+# Most bytes held at once for one read or decompression step
+READ_SIZE = 64 * 1024
+
+class BodyReader:
+    # Decodes response body while it arrives, so it is never kept whole in memory
+    def __init__(self, connection: Connection, status: int, headers: dict[str, str]) -> None:
+        self.connection: Connection = connection
+        self.chunked: bool = headers.get("transfer-encoding", "").casefold() == "chunked"
+        self.length: int | None = None
+        if status < 200 or status in (204, 304):
+            # These responses never have body, even without length
+            self.chunked = False
+            self.length = 0
+        elif not self.chunked and "content-length" in headers:
+            self.length = int(headers["content-length"])
+        # Body without length ends, when server closes connection
+        self.until_close: bool = not self.chunked and self.length is None
+        encoding = headers.get("content-encoding", "").casefold()
+        self.decompressor: zlib._Decompress | None = None
+        # Start of deflate body, kept until it is known if it has zlib header
+        self.deflate_start: bytes | None = None
+        if encoding == "gzip":
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            self.decompressor = zlib.decompressobj()
+            self.deflate_start = b""
+        # Characters split between chunks are kept until rest of their bytes arrives
+        self.decoder: codecs.IncrementalDecoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # Set when body was read to its end, so connection can be reused
+        self.complete: bool = False
+
+    async def raw(self) -> AsyncIterator[bytes]:
+        if self.chunked:
+            while True:
+                # Chunk extensions after ';' are ignored
+                chunk_length = int((await self.connection.readline()).split(b";", 1)[0], 16)
+                if chunk_length == 0: break
+                while chunk_length > 0:
+                    data = await self.connection.readexactly(min(chunk_length, READ_SIZE))
+                    chunk_length -= len(data)
+                    yield data
+                await self.connection.readline() # Pass \r\n on chunk end
+            # Trailer headers end with empty line
+            while (await self.connection.readline()).strip(): pass
+        elif self.length is not None:
+            remaining = self.length
+            while remaining > 0:
+                data = await self.connection.readexactly(min(remaining, READ_SIZE))
+                remaining -= len(data)
+                yield data
+        else:
+            while True:
+                data = await self.connection.read(READ_SIZE)
+                if not data: break
+                yield data
+        self.complete = True
+
+    async def chunks(self) -> AsyncIterator[str]:
+        async for data in self.raw():
+            for text in self.decode(data):
+                yield text
+        for text in self.decode(b"", final=True):
+            yield text
+
+    def decode(self, data: bytes, final: bool = False) -> Iterator[str]:
+        if self.decompressor is None:
+            text = self.decoder.decode(data, final)
+            if text: yield text
+            return
+        if self.deflate_start is not None: self.deflate_start += data
+        # Output is limited, so small compressed chunk can not take much memory
+        while data:
+            try:
+                output = self.decompressor.decompress(data, READ_SIZE)
+            except zlib.error:
+                if self.deflate_start is None: raise
+                # Some servers send raw deflate without zlib header, so body is read again as it
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                data, self.deflate_start = self.deflate_start, None
+                continue
+            if output: self.deflate_start = None
+            text = self.decoder.decode(output)
+            data = self.decompressor.unconsumed_tail
+            if text: yield text
+        if final:
+            text = self.decoder.decode(self.decompressor.flush(), True)
+            if text: yield text
@@ -1,24 +1,48 @@
 import ctypes
 import math
+import threading
 import sdl2
 import skia
-from typing import Literal
+from typing import Callable, Literal
 from .URL import URL
-from .Tab import Tab
+from .Tab import CommitData, Tab, SCROLL_STEP
 from .Chrome import Chrome
+from .Draw import Draw, DrawRect, DrawRRect, LAYER_CACHE, damage, record
+from .TileCache import TileCache, RASTER_THREADS
 from .Layout import Dimensions
+from .Trace import counter, traced, tracing
+
+# More damaged rects are merged into one
+MAX_DAMAGE_RECTS = 8
+# Used when display refresh rate is unknown
+DEFAULT_REFRESH_RATE = 60
+SCROLLBAR_OFFSET = 2
+
+def window_color_type(surface: sdl2.SDL_Surface) -> skia.ColorType | None:
+    # Skia color type with same memory layout as window pixels
+    pixel_format = surface.format.contents
+    if pixel_format.BytesPerPixel != 4 or sdl2.SDL_MUSTLOCK(surface): return None
+    masks = (pixel_format.Rmask, pixel_format.Gmask, pixel_format.Bmask)
+    if sdl2.SDL_BYTEORDER == sdl2.SDL_BIG_ENDIAN:
+        bgra, rgba = (0x0000ff00, 0x00ff0000, 0xff000000), (0xff000000, 0x00ff0000, 0x0000ff00)
+    else:
+        bgra, rgba = (0x00ff0000, 0x0000ff00, 0x000000ff), (0x000000ff, 0x0000ff00, 0x00ff0000)
+    if masks == bgra: return skia.kBGRA_8888_ColorType
+    if masks == rgba: return skia.kRGBA_8888_ColorType
+    return None
 
 class Browser:
-    def __init__(self) -> None:
+    def __init__(self, raster_threads: int = RASTER_THREADS) -> None:
+        # Masks of BGRA pixels, same as tiles, so they are composited without swizzling
         if sdl2.SDL_BYTEORDER == sdl2.SDL_BIG_ENDIAN:
-            self.RED_MASK = 0xff000000
+            self.RED_MASK = 0x0000ff00
             self.GREEN_MASK = 0x00ff0000
-            self.BLUE_MASK = 0x0000ff00
+            self.BLUE_MASK = 0xff000000
             self.ALPHA_MASK = 0x000000ff
         else:
-            self.RED_MASK = 0x000000ff
+            self.RED_MASK = 0x00ff0000
             self.GREEN_MASK = 0x0000ff00
-            self.BLUE_MASK = 0x00ff0000
+            self.BLUE_MASK = 0x000000ff
             self.ALPHA_MASK = 0xff000000
         self.dimensions = Dimensions(
             width=800,
@@ -26,6 +50,35 @@ class Browser:
             hstep=13,
             vstep=18,
         )
+        # Events only mark what is outdated, frame() updates it once per frame
+        self.needs_frame: bool = False
+        self.needs_raster: bool = False
+        self.needs_chrome_raster: bool = False
+        self.needs_scroll: bool = False
+        self.scroll_delta: int = 0
+        self.pending_size: tuple[int, int] | None = None
+        # Pushed by other threads, to wake main loop waiting for events
+        self.wake_event: int = sdl2.SDL_RegisterEvents(1)
+        # Guards state shared with tab threads
+        self.lock: threading.Lock = threading.Lock()
+        # Asked by tab threads, shown in next frame, since SDL message boxes need browser thread
+        self.pending_messageboxes: list[tuple[Literal["INFORMATION", "WARNING", "ERROR"], str, str, Tab | None, Callable[[bool], None] | None]] = []
+        # Last state committed by active tab, browser thread scrolls and rasters only this
+        self.active_tab_scroll: float = 0
+        self.active_tab_height: float = 0
+        self.active_tab_display_list: list[Draw] = []
+        self.active_tab_title: str | None = None
+        self.active_tab_url: URL = URL("about:blank")
+        self.active_tab_can_back: bool = False
+        self.active_tab_can_forward: bool = False
+        self.active_tab_bookmarked: bool = False
+        self.tab_picture: skia.Picture | None = None
+        # Changed areas of tab since last raster, in document coordinates, None if all of it
+        self.tab_damage: list[skia.Rect] | None = None
+        self.window_title: str | None = None
+        self.cursor: Literal["DEFAULT", "LOADING"] = "DEFAULT"
+        self.sdl_cursor: sdl2.SDL_Cursor | None = None
+        self.sdl_cursor_id: int | None = None
         self.tabs: list[Tab] = []
         self.active_tab: Tab = Tab(self)
         self.chrome: Chrome = Chrome(self)
@@ -35,149 +88,408 @@ class Browser:
             sdl2.SDL_WINDOWPOS_CENTERED, sdl2.SDL_WINDOWPOS_CENTERED,
             self.dimensions["width"], self.dimensions["height"], sdl2.SDL_WINDOW_SHOWN
         )
-        self.root_surface: skia.Surface = skia.Surface.MakeRaster(
-            skia.ImageInfo.Make(
-                self.dimensions["width"], self.dimensions["height"],
-                ct=skia.kRGBA_8888_ColorType,
-                at=skia.kUnpremul_AlphaType
-            )
-        )
+        # Areas of window, that have to be composited and presented again
+        self.damage: list[skia.IRect] = []
+        self.root_pixels: ctypes.Array | None = None
+        self.root_sdl_surface: sdl2.SDL_Surface | None = None
+        self.frame_interval: float = 1 / self.refresh_rate()
+        self.make_root_surface()
         self.chrome_surface: skia.Surface = skia.Surface(self.dimensions["width"], self.chrome.bottom)
-        self.tab_surface: skia.Surface | None = None
+        # Static part of chrome is recorded once per width, only tab state is painted again
+        self.chrome_static_picture: skia.Picture | None = None
+        self.chrome_picture: skia.Picture | None = None
+        self.chrome_cmds: list[Draw] | None = None
+        self.scrollbar_surface: skia.Surface | None = None
+        self.scrollbar_keys: list[tuple] | None = None
+        self.tiles: TileCache = TileCache(threads=raster_threads)
 
     # Handlers
     def handle_quit(self) -> None:
+        for tab in self.tabs:
+            tab.task_runner.set_needs_quit()
+        self.tiles.close()
+        sdl2.SDL_FreeSurface(self.root_sdl_surface)
         sdl2.SDL_DestroyWindow(self.sdl_window)
 
     def handle_up(self) -> None:
-        self.active_tab.up()
-        self.raster_tab(sb_only=True)
-        self.draw()
+        self.handle_scrollwheel(1)
 
     def handle_down(self) -> None:
-        self.active_tab.down()
-        self.raster_tab(sb_only=True)
-        self.draw()
+        self.handle_scrollwheel(-1)
 
     def handle_scrollwheel(self, delta: int) -> None:
-        self.active_tab.scrollwheel(delta)
-        self.raster_tab(sb_only=True)
-        self.draw()
+        # Deltas are summed, so burst of wheel events scrolls once per frame
+        self.scroll_delta += delta
+        self.set_needs_frame()
 
     def handle_configure(self, width: int, height: int) -> None:
-        if self.dimensions["width"] == width \
-        and self.dimensions["height"] == height : return
-        self.dimensions["width"] = width
-        self.dimensions["height"] = height
-        self.root_surface = skia.Surface.MakeRaster(
-            skia.ImageInfo.Make(
-                width, height,
-                ct=skia.kRGBA_8888_ColorType,
-                at=skia.kUnpremul_AlphaType
-            )
-        )
-        self.chrome_surface = skia.Surface(
-            self.dimensions["width"], 
-            self.chrome.bottom
-        )
-        self.tab_surface = None # Reset for automatic resize at `self.raster_tab()`
-        self.active_tab.configure()
-        self.chrome.configure()
-        self.raster_chrome()
-        self.raster_tab()
-        self.draw()
+        # Only latest size is applied in next frame
+        self.pending_size = (width, height)
+        self.set_needs_frame()
 
     def handle_click(self, e: sdl2.SDL_MouseButtonEvent) -> None:
         if e.y < self.chrome.bottom:
             self.focus = None
-            self.active_tab.blur()
+            self.active_tab.schedule_task(self.active_tab.blur)
             self.chrome.click(e.x, e.y)
         else:
             self.focus = "content"
             self.chrome.blur()
-            tab_y = e.y - self.chrome.bottom
-            self.active_tab.click(e.x, tab_y)
-        self.raster_chrome()
-        self.raster_tab()
-        self.draw()
+            tab_y = e.y - self.chrome.bottom + self.active_tab_scroll
+            self.active_tab.schedule_task(self.active_tab.click, e.x, tab_y)
+        self.set_needs_chrome_raster()
+
+    def handle_expose(self) -> None:
+        self.damage_all()
+        self.set_needs_frame()
 
     def handle_middle_click(self, e: sdl2.SDL_MouseButtonEvent) -> None:
         if e.y < self.chrome.bottom: return
-        tab_y = e.y - self.chrome.bottom
-        url = self.active_tab.middle_click(e.x, tab_y)
-        if not url: return
-        self.new_tab(url)
+        tab_y = e.y - self.chrome.bottom + self.active_tab_scroll
+        self.active_tab.schedule_task(self.active_tab.middle_click, e.x, tab_y)
 
     def handle_key(self, char: str) -> None:
         if not (0x20 <= ord(char) < 0x7f): return
         if self.chrome.keypress(char):
-            self.raster_chrome()
-            self.draw()
+            self.set_needs_chrome_raster()
         elif self.focus == "content":
-            if self.active_tab.keypress(char):
-                self.raster_tab()
-                self.draw()
+            self.active_tab.schedule_task(self.active_tab.keypress, char)
 
     def handle_enter(self) -> None:
         if self.chrome.enter():
-            self.raster_chrome()
-            self.raster_tab()
-            self.draw()
+            self.set_needs_chrome_raster()
         elif self.focus == "content":
-            if self.active_tab.enter():
-                self.raster_tab()
-                self.draw()
+            self.active_tab.schedule_task(self.active_tab.enter)
 
     def handle_backspace(self) -> None:
         if self.chrome.backspace():
-            self.raster_chrome()
-            self.draw()
+            self.set_needs_chrome_raster()
         elif self.focus == "content":
-            if self.active_tab.backspace():
-                self.raster_tab()
-                self.draw()
+            self.active_tab.schedule_task(self.active_tab.backspace)
 
     def handle_left(self) -> None:
         if self.chrome.left():
-            self.raster_chrome()
-            self.draw()
+            self.set_needs_chrome_raster()
 
     def handle_right(self) -> None:
         if self.chrome.right():
-            self.raster_chrome()
+            self.set_needs_chrome_raster()
+
+    # Frame scheduling
+    def set_needs_frame(self) -> None:
+        self.needs_frame = True
+        if threading.current_thread() is not threading.main_thread():
+            self.wake()
+
+    def wake(self) -> None:
+        # SDL_PushEvent is thread safe, unlike rest of SDL
+        event = sdl2.SDL_Event()
+        event.type = self.wake_event
+        sdl2.SDL_PushEvent(ctypes.byref(event))
+
+    def set_needs_raster(self) -> None:
+        self.needs_raster = True
+        self.set_needs_frame()
+
+    def set_needs_chrome_raster(self) -> None:
+        self.needs_chrome_raster = True
+        self.set_needs_frame()
+
+    def refresh_rate(self) -> int:
+        mode = sdl2.SDL_DisplayMode()
+        display = sdl2.SDL_GetWindowDisplayIndex(self.sdl_window)
+        if display < 0 or sdl2.SDL_GetCurrentDisplayMode(display, ctypes.byref(mode)) != 0:
+            return DEFAULT_REFRESH_RATE
+        return mode.refresh_rate or DEFAULT_REFRESH_RATE
+
+    @traced("frame")
+    def frame(self) -> None:
+        # Runs every outdated step of pipeline once, for all events since last frame
+        if not self.needs_frame: return
+        self.needs_frame = False
+        with self.lock:
+            if self.pending_size is not None:
+                self.configure(*self.pending_size)
+                self.pending_size = None
+            # Scrolls already rastered content, even while tab thread is busy
+            if self.scroll_delta != 0 or self.needs_scroll:
+                self.scroll_to(self.active_tab_scroll - self.scroll_delta * SCROLL_STEP)
+                self.scroll_delta = 0
+            if self.needs_chrome_raster:
+                self.raster_chrome()
+                self.needs_chrome_raster = False
+            if self.needs_raster or self.needs_scroll:
+                self.raster_tab(scroll_only=not self.needs_raster)
+                self.needs_raster = False
+                self.needs_scroll = False
+            self.update_title()
+            self.update_cursor()
+            # Damage left by rastering is what needs to be drawn
             self.draw()
+            if tracing():
+                counter("tiles", count=len(self.tiles), bytes=self.tiles.size())
+                counter("layers", count=len(LAYER_CACHE), bytes=LAYER_CACHE.size())
+        # Shown after lock is released, so tabs can commit while message box is open
+        self.show_pending_messageboxes()
 
-    # Methods
-    def raster_tab(self, sb_only: bool = False) -> None:
-        tab_height = math.ceil(self.active_tab.document.height + 2*self.dimensions["vstep"])
-        if self.tab_surface is None or tab_height != self.tab_surface.height():
-            self.tab_surface = skia.Surface(self.dimensions["width"], tab_height) 
-        assert self.tab_surface is not None
-        canvas = self.tab_surface.getCanvas()
-        if sb_only: # For scrollbar redraw only
-            self.active_tab.raster_scrollbar(canvas)
-            return
-        canvas.clear(skia.ColorWHITE)
-        self.active_tab.raster(canvas)
+    def commit(self, tab: Tab, data: CommitData) -> None:
+        # Called from tab thread, after it has rendered
+        with self.lock:
+            if tab is not self.active_tab: return
+            if data.display_list is not self.active_tab_display_list:
+                if self.tab_damage is not None and data.previous_display_list is self.active_tab_display_list:
+                    self.tab_damage.extend(data.damage)
+                else: # Other tab was shown or tab has not committed yet
+                    self.tab_damage = None
+                self.active_tab_display_list = data.display_list
+                self.tab_picture = None
+                self.needs_raster = True
+            if data.height != self.active_tab_height: self.needs_scroll = True
+            self.active_tab_height = data.height
+            self.active_tab_title = data.title
+            # Chrome is rastered again, only if its state has changed
+            chrome_state = (data.url, data.can_back, data.can_forward, data.bookmarked)
+            if chrome_state != (self.active_tab_url, self.active_tab_can_back, self.active_tab_can_forward, self.active_tab_bookmarked):
+                self.active_tab_url, self.active_tab_can_back, self.active_tab_can_forward, self.active_tab_bookmarked = chrome_state
+                self.needs_chrome_raster = True
+            if data.scroll is not None: 
+                self.active_tab_scroll = data.scroll
+                self.needs_scroll = True
+            self.set_needs_frame()
+
+    def scroll_to(self, scroll: float) -> None:
+        if scroll < 0: scroll = 0
+        else: scroll = min(scroll, self.max_scroll())
+        if scroll == self.active_tab_scroll: return
+        self.active_tab_scroll = scroll
+        self.needs_scroll = True
+        self.active_tab.schedule_task(self.active_tab.set_scroll, scroll)
 
+    def max_scroll(self) -> float:
+        h = (
+            self.active_tab_height
+            - self.dimensions["height"]
+            + self.chrome.bottom
+            + self.dimensions["vstep"] * 2
+        )
+        return max(0, h)
+
+    def configure(self, width: int, height: int) -> None:
+        if self.dimensions["width"] == width \
+        and self.dimensions["height"] == height : return
+        width_changed = self.dimensions["width"] != width
+        self.dimensions["width"] = width
+        self.dimensions["height"] = height
+        self.frame_interval = 1 / self.refresh_rate() # Window could be moved to other display
+        self.make_root_surface()
+        # Height only changes scroll range, layout stays the same
+        self.needs_scroll = True
+        for tab in self.tabs:
+            tab.schedule_task(tab.configure, self.dimensions.copy())
+        if width_changed:
+            self.chrome_surface = skia.Surface(
+                self.dimensions["width"], 
+                self.chrome.bottom
+            )
+            self.chrome_cmds = None
+            self.chrome_static_picture = None
+            self.tab_damage = None # All of tab is laid out again
+            self.chrome.configure()
+            self.needs_chrome_raster = True
+
+    @traced("raster_tab")
+    def raster_tab(self, scroll_only: bool = False) -> None:
+        tab_height = math.ceil(self.active_tab_height + 2*self.dimensions["vstep"])
+        bounds = skia.Rect.MakeWH(self.dimensions["width"], tab_height)
+        # Display list is recorded once and replayed for every tile
+        if self.tab_picture is None:
+            self.tab_picture = record(self.active_tab_display_list, bounds)
+        picture = self.tab_picture
+        paint = lambda canvas: canvas.drawPicture(picture)
+        if not scroll_only: # Display list has changed
+            if self.tab_damage is None: self.tiles.invalidate()
+            else: self.tiles.repaint(paint, self.tab_damage)
+        self.tiles.raster(paint, self.tab_viewport(), bounds)
+        self.raster_scrollbar()
+        if scroll_only or self.needs_scroll or self.tab_damage is None:
+            self.damage_rect(self.tab_rect())
+        else:
+            # Only changed areas are composited again, when tab has not moved
+            offset = self.chrome.bottom - self.active_tab_scroll
+            for rect in self.tab_damage:
+                window_rect = rect.makeOffset(0, offset)
+                if window_rect.intersect(self.tab_rect()): self.damage_rect(window_rect)
+        if not scroll_only: self.tab_damage = []
+
+    def paint_scrollbar(self) -> list[Draw]:
+        # Scrollbar is overlay layer, so it is painted relative to its own top left corner
+        dh = self.max_scroll()
+        # Bg
+        sb_rect = skia.Rect.MakeWH(self.dimensions["hstep"], dh)
+        if dh > 0:
+            ratio = int(
+                (self.active_tab_scroll / dh) 
+                * (self.dimensions["height"] - self.chrome.bottom - self.dimensions["vstep"])
+            )
+            scrollbar_rect = skia.Rect.MakeXYWH(
+                sb_rect.left() + SCROLLBAR_OFFSET,
+                ratio + SCROLLBAR_OFFSET,
+                self.dimensions["hstep"] - SCROLLBAR_OFFSET*2,
+                self.dimensions["vstep"] - SCROLLBAR_OFFSET*2
+            )
+            return [DrawRect(sb_rect, "lightgrey"), DrawRRect(scrollbar_rect, 3, "grey")]
+        return [DrawRect(sb_rect, "white")]
+
+    def raster_scrollbar(self) -> None:
+        cmds = self.paint_scrollbar()
+        keys = [cmd.key(0, 0) for cmd in cmds]
+        width = self.dimensions["hstep"]
+        height = self.dimensions["height"] - self.chrome.bottom
+        surface = self.scrollbar_surface
+        if surface is not None and surface.width() == width and surface.height() == height:
+            # Scrollbar has not changed
+            if keys == self.scrollbar_keys: return
+        else:
+            surface = self.scrollbar_surface = skia.Surface(width, height)
+        self.scrollbar_keys = keys
+        canvas = surface.getCanvas()
+        canvas.clear(skia.ColorTRANSPARENT)
+        for cmd in cmds:
+            cmd.execute(canvas)
+        self.damage_rect(self.scrollbar_rect())
+
+    def scrollbar_rect(self) -> skia.Rect:
+        # Area of window, where scrollbar layer is drawn
+        return skia.Rect.MakeLTRB(
+            self.dimensions["width"] - self.dimensions["hstep"], self.chrome.bottom, 
+            self.dimensions["width"], self.dimensions["height"]
+        )
+
+    def tab_rect(self) -> skia.Rect:
+        # Area of window, where tab is drawn
+        return skia.Rect.MakeLTRB(
+            0, self.chrome.bottom, self.dimensions["width"], self.dimensions["height"]
+        )
+
+    def tab_viewport(self) -> skia.Rect:
+        # Visible part of tab in document coordinates
+        return skia.Rect.MakeXYWH(
+            0, self.active_tab_scroll,
+            self.dimensions["width"], self.dimensions["height"] - self.chrome.bottom
+        )
+
+    @traced("raster_chrome")
     def raster_chrome(self) -> None:
+        bounds = skia.Rect.MakeWH(self.dimensions["width"], self.chrome.bottom)
+        if self.chrome_static_picture is None:
+            self.chrome_static_picture = record(self.chrome.paint_static(), bounds)
+        cmds = self.chrome.paint()
+        self.chrome_picture = record(cmds, bounds)
+        # Only changed commands are rastered again
+        if self.chrome_cmds is None: dirty = [bounds]
+        else: dirty = damage(self.chrome_cmds, cmds)
+        self.chrome_cmds = cmds
         canvas = self.chrome_surface.getCanvas()
-        canvas.clear(skia.ColorWHITE)
-        for cmd in self.chrome.paint():
-            cmd.execute(canvas)
+        for rect in dirty:
+            canvas.save()
+            canvas.clipRect(rect)
+            canvas.clear(skia.ColorWHITE)
+            canvas.drawPicture(self.chrome_static_picture)
+            canvas.drawPicture(self.chrome_picture)
+            canvas.restore()
+            self.damage_rect(rect)
+
+    def make_root_surface(self, direct: bool = True) -> None:
+        if self.root_sdl_surface is not None:
+            sdl2.SDL_FreeSurface(self.root_sdl_surface)
+            self.root_sdl_surface = None
+        # Window surface is recreated by SDL after resize
+        window_surface = sdl2.SDL_GetWindowSurface(self.sdl_window).contents
+        color_type = window_color_type(window_surface)
+        if direct and color_type is not None:
+            # Skia draws straight into window pixels, so frame is not copied at all
+            pixel_format = window_surface.format.contents
+            alpha_type = skia.kOpaque_AlphaType if pixel_format.Amask == 0 else skia.kPremul_AlphaType
+            self.root_pixels = (ctypes.c_uint8 * (window_surface.pitch * window_surface.h)).from_address(
+                window_surface.pixels
+            )
+            self.root_surface: skia.Surface = skia.Surface.MakeRasterDirect(
+                skia.ImageInfo.Make(window_surface.w, window_surface.h, color_type, alpha_type),
+                self.root_pixels, window_surface.pitch
+            )
+            self.damage_all()
+            return
+        # Other formats are drawn into own pixels, that SDL converts when blitting
+        width, height = self.dimensions["width"], self.dimensions["height"]
+        self.root_pixels = (ctypes.c_uint8 * (4 * width * height))()
+        self.root_surface = skia.Surface.MakeRasterDirect(
+            skia.ImageInfo.Make(
+                width, height,
+                ct=skia.kBGRA_8888_ColorType,
+                at=skia.kPremul_AlphaType
+            ),
+            self.root_pixels, 4 * width
+        )
+        depth = 32 # Bites per pixel
+        self.root_sdl_surface = sdl2.SDL_CreateRGBSurfaceFrom(
+            self.root_pixels, width, height, depth, 4 * width,
+            self.RED_MASK, self.GREEN_MASK,
+            self.BLUE_MASK, self.ALPHA_MASK
+        )
+        # Frame is opaque, so blit copies pixels instead of blending them
+        sdl2.SDL_SetSurfaceBlendMode(self.root_sdl_surface, sdl2.SDL_BLENDMODE_NONE)
+        self.damage_all()
+
+    def damage_rect(self, rect: skia.Rect) -> None:
+        window = skia.IRect.MakeWH(self.dimensions["width"], self.dimensions["height"])
+        irect = rect.roundOut()
+        if irect.intersect(window): self.damage.append(irect)
 
+    def damage_all(self) -> None:
+        self.damage = [skia.IRect.MakeWH(self.dimensions["width"], self.dimensions["height"])]
+
+    @traced("draw")
     def draw(self) -> None:
+        if not self.damage: return
+        if len(self.damage) > MAX_DAMAGE_RECTS:
+            union = skia.IRect.MakeEmpty()
+            for irect in self.damage: union.join(irect)
+            self.damage = [union]
+        if tracing():
+            counter("damage", rects=len(self.damage), pixels=sum(irect.width() * irect.height() for irect in self.damage))
         canvas = self.root_surface.getCanvas()
+        for irect in self.damage:
+            canvas.save()
+            canvas.clipRect(skia.Rect.Make(irect))
+            self.composite(canvas)
+            canvas.restore()
+        rects = (sdl2.SDL_Rect * len(self.damage))(*(
+            sdl2.SDL_Rect(irect.x(), irect.y(), irect.width(), irect.height()) 
+            for irect in self.damage
+        ))
+        if self.root_sdl_surface is not None:
+            # SDL_BlitSurface is what accually does copy, only of damaged pixels
+            window_surface = sdl2.SDL_GetWindowSurface(self.sdl_window)
+            for rect in rects:
+                dst = sdl2.SDL_Rect(rect.x, rect.y, rect.w, rect.h)
+                sdl2.SDL_BlitSurface(self.root_sdl_surface, rect, window_surface, dst)
+        sdl2.SDL_UpdateWindowSurfaceRects(self.sdl_window, rects, len(rects))
+        self.damage = []
+
+    def composite(self, canvas: skia.Canvas) -> None:
         canvas.clear(skia.ColorWHITE)
-        tab_rect = skia.Rect.MakeLTRB(
-            0, self.chrome.bottom, self.dimensions["width"], self.dimensions["height"]
-        )
-        tab_offset = self.chrome.bottom - self.active_tab.scroll
+        tab_offset = self.chrome.bottom - self.active_tab_scroll
         canvas.save()
-        if self.tab_surface is not None:
-            canvas.clipRect(tab_rect)
-            canvas.translate(0, tab_offset)
-            self.tab_surface.draw(canvas, 0, 0)
+        canvas.clipRect(self.tab_rect())
+        canvas.translate(0, tab_offset)
+        self.tiles.draw(canvas, self.tab_viewport())
+        canvas.restore()
+        # Scroll only moves tiles, scrollbar layer stays in place over them
+        if self.scrollbar_surface is not None:
+            rect = self.scrollbar_rect()
+            canvas.save()
+            canvas.clipRect(rect)
+            self.scrollbar_surface.draw(canvas, rect.left(), rect.top())
             canvas.restore()
         chrome_rect = skia.Rect.MakeLTRB(
             0, 0, self.dimensions["width"], self.chrome.bottom
@@ -186,39 +498,54 @@ class Browser:
         canvas.clipRect(chrome_rect)
         self.chrome_surface.draw(canvas, 0, 0)
         canvas.restore()
-        skia_image = self.root_surface.makeImageSnapshot()
-        skia_bytes = skia_image.tobytes()
-        depth = 32 # Bites per pixel
-        pitch = 4 * self.dimensions["width"]
-        sdl_surface = sdl2.SDL_CreateRGBSurfaceFrom(
-            skia_bytes, self.dimensions["width"], self.dimensions["height"], depth, pitch,
-            self.RED_MASK, self.GREEN_MASK,
-            self.BLUE_MASK, self.ALPHA_MASK
-        )
-        rect = sdl2.SDL_Rect(0, 0, self.dimensions["width"], self.dimensions["height"])
-        window_surface = sdl2.SDL_GetWindowSurface(self.sdl_window)
-        # SDL_BlitSurface is what accually does copy
-        sdl2.SDL_BlitSurface(sdl_surface, rect, window_surface, rect)
-        sdl2.SDL_UpdateWindowSurface(self.sdl_window)
     
     def new_tab(self, url: URL) -> None:
+        # Can be called from tab thread too, so tab list is changed under lock
         new_tab = Tab(self)
-        new_tab.load(url)
-        self.set_cursor("LOADING")
-        self.active_tab = new_tab
-        self.tabs.append(new_tab)
-        self.raster_tab()
-        self.raster_chrome()
-        self.draw()
-        self.update_title()
-        self.set_cursor("DEFAULT")
+        new_tab.schedule_task(new_tab.load, url)
+        with self.lock:
+            self.tabs.append(new_tab)
+        self.set_active_tab(new_tab)
+
+    def set_active_tab(self, tab: Tab) -> None:
+        with self.lock:
+            self.active_tab = tab
+            self.needs_chrome_raster = True
+        # Content of previous tab stays, until this one commits
+        tab.schedule_task(tab.activate)
+        self.set_needs_frame()
         
     def update_title(self) -> None:
-        title = self.active_tab.page_title()
+        title = self.active_tab_title
         if title is not None: title = "{} – StrangeBrows".format(title)
         else: title = ("StrangeBrows")
+        if title == self.window_title: return
+        self.window_title = title
         sdl2.SDL_SetWindowTitle(self.sdl_window, title.encode())
 
+    def post_messagebox(self,
+    type: Literal["INFORMATION", "WARNING", "ERROR"],
+    title: str,
+    message: str,
+    tab: Tab | None = None,
+    on_answer: Callable[[bool], None] | None = None
+    ) -> None:
+        # Called from tab threads, yes/no answer is given back to tab as task
+        with self.lock:
+            self.pending_messageboxes.append((type, title, message, tab, on_answer))
+        self.set_needs_frame()
+
+    def show_pending_messageboxes(self) -> None:
+        with self.lock:
+            messageboxes = self.pending_messageboxes
+            self.pending_messageboxes = []
+        for type, title, message, tab, on_answer in messageboxes:
+            if tab is None or on_answer is None:
+                self.show_simple_messagebox(type, title, message)
+                continue
+            answer = self.show_yesno_messagebox(type, title, message)
+            tab.schedule_task(on_answer, answer)
+
     def show_simple_messagebox(self, 
     type: Literal["INFORMATION", "WARNING", "ERROR"], 
     title: str, 
@@ -291,11 +618,18 @@ class Browser:
         return btnid.value == 1 # True if "Yes", False if "No" or closed
     
     def set_cursor(self, type: Literal["DEFAULT", "LOADING"]) -> None:
-        match type:
-            case "DEFAULT":
-                cursor = sdl2.SDL_CreateSystemCursor(sdl2.SDL_SYSTEM_CURSOR_ARROW)
-            case "LOADING":
-                cursor = sdl2.SDL_CreateSystemCursor(sdl2.SDL_SYSTEM_CURSOR_WAIT)
-            case _:
-                cursor = sdl2.SDL_CreateSystemCursor(sdl2.SDL_SYSTEM_CURSOR_ARROW)
-        sdl2.SDL_SetCursor(cursor)
\ No newline at end of file
+        # Called from tab threads, so cursor is changed in next frame on browser thread
+        self.cursor = type
+        self.set_needs_frame()
+
+    def update_cursor(self) -> None:
+        match self.cursor:
+            case "DEFAULT": id = sdl2.SDL_SYSTEM_CURSOR_ARROW
+            case "LOADING": id = sdl2.SDL_SYSTEM_CURSOR_WAIT
+            case _: id = sdl2.SDL_SYSTEM_CURSOR_ARROW
+        if self.sdl_cursor_id == id: return
+        cursor = sdl2.SDL_CreateSystemCursor(id)
+        sdl2.SDL_SetCursor(cursor)
+        if self.sdl_cursor is not None: sdl2.SDL_FreeCursor(self.sdl_cursor)
+        self.sdl_cursor = cursor
+        self.sdl_cursor_id = id
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from .HTMLParser import Element, Text
+from .Color import is_color
 
 INHERITED_PROPERTIES = {
     "font-size": "16px",
@@ -310,16 +311,30 @@ def style(node: Element | Text, rules: list[CSS_rule]) -> None:
                     i < len(shorthand) - 1:
                         i += 1
                         ext_prop, vals, req = shorthand[i]
-                    node.style[ext_prop] = seg
+                    if is_valid(ext_prop, seg): node.style[ext_prop] = seg
                     i += 1
                 ext_prop = shorthand[i][0]
-                node.style[ext_prop] = value
-            else:
+                if is_valid(ext_prop, value): node.style[ext_prop] = value
+            elif is_valid(property, value):
                 node.style[property] = value
+    # `hidden` attribute, can be overriden only by inline styles
+    if isinstance(node, Element) and "hidden" in node.attributes:
+        node.style["display"] = "none"
     if isinstance(node, Element) and "style" in node.attributes:
         pairs = CSSParser(node.attributes["style"]).body()
         for property, value in pairs.items():
-            node.style[property] = value
+            if is_valid(property, value): node.style[property] = value
+    # currentcolor resolves to the element color, which itself inherits it
+    if node.style["color"].strip().casefold() == "currentcolor":
+        node.style["color"] = node.parent.style["color"] if node.parent else INHERITED_PROPERTIES["color"]
+    for property, value in node.style.items():
+        if is_color_property(property) and value.strip().casefold() == "currentcolor":
+            node.style[property] = node.style["color"]
+    # contain-intrinsic-size is expanded to its width and height
+    if "contain-intrinsic-size" in node.style:
+        width, height = split_contain_intrinsic_size(node.style["contain-intrinsic-size"])
+        node.style.setdefault("contain-intrinsic-width", width)
+        node.style.setdefault("contain-intrinsic-height", height)
     if node.style["font-size"].endswith("%"):
         if node.parent:
             parent_font_size = node.parent.style["font-size"]
@@ -328,9 +343,29 @@ def style(node: Element | Text, rules: list[CSS_rule]) -> None:
         node_pct = float(node.style["font-size"][:-1]) / 100
         parent_px = float(parent_font_size[:-2])
         node.style["font-size"] = str(node_pct * parent_px) + "px"
+    # Undisplayed subtrees are never laid out, so their styles are not computed
+    if node.style.get("display") == "none": return
     for child in node.children:
         style(child, rules)
 
+def is_color_property(property: str) -> bool:
+    return property == "color" or property.endswith("-color")
+
+def is_valid(property: str, value: str) -> bool:
+    # Invalid declarations are dropped, so previous ones still apply
+    if is_color_property(property): return is_color(value)
+    return True
+
+def split_contain_intrinsic_size(value: str) -> tuple[str, str]:
+    values: list[str] = []
+    for seg in value.split():
+        # `auto` keyword belongs to following length
+        if values and values[-1] == "auto": values[-1] += " " + seg
+        else: values.append(seg)
+    if not values: return "none", "none"
+    if len(values) == 1: return values[0], values[0]
+    return values[0], values[1]
+
 def cascade_priority(rule: CSS_rule) -> int:
     selector, body = rule
     return selector.priority
@@ -75,7 +75,8 @@ class Chrome:
             tabs_start + tab_width * (i + 1), self.tabbar_bottom
         )
     
-    def paint(self) -> list[Draw]:
+    def paint_static(self) -> list[Draw]:
+        # Parts, that change only with window width
         cmds: list[Draw] = []
         # Background
         cmds.append(DrawRect(
@@ -85,8 +86,29 @@ class Chrome:
         cmds.append(DrawLine(
             0, self.bottom-1, self.browser.dimensions["width"], self.bottom-1,
         "black", 1))
+        # Refresh button
+        cmds.append(DrawOutline(self.refresh_rect, "black", 1))
+        cmds.append(DrawText(
+            self.refresh_rect.left() + self.padding,
+            self.refresh_rect.top(),
+            "\N{clockwise gapped circle arrow}", self.font, "black"
+        ))
+        # New tab button
+        cmds.append(DrawOutline(self.newtab_rect, "black", 1))
+        cmds.append(DrawText(
+            self.newtab_rect.left() + self.padding,
+            self.newtab_rect.top(),
+            "+", self.font, "black"
+        ))
+        # Address bar
+        cmds.append(DrawOutline(self.address_rect, "black", 1))
+        return cmds
+    
+    def paint(self) -> list[Draw]:
+        # Parts, that depend on tab state, drawn over static ones
+        cmds: list[Draw] = []
         # Back button
-        if not self.browser.active_tab.can_back():
+        if not self.browser.active_tab_can_back:
             cmds.append(DrawRect(self.back_rect, "grey"))
         cmds.append(DrawOutline(self.back_rect, "black", 1))
         cmds.append(DrawText(
@@ -95,7 +117,7 @@ class Chrome:
             "<", self.font, "black"
         ))
         # Forward button
-        if not self.browser.active_tab.can_forward():
+        if not self.browser.active_tab_can_forward:
             cmds.append(DrawRect(self.forward_rect, "grey"))
         cmds.append(DrawOutline(self.forward_rect, "black", 1))
         cmds.append(DrawText(
@@ -103,23 +125,8 @@ class Chrome:
             self.forward_rect.top(),
             ">", self.font, "black"
         ))
-        # Refresh button
-        cmds.append(DrawOutline(self.refresh_rect, "black", 1))
-        cmds.append(DrawText(
-            self.refresh_rect.left() + self.padding,
-            self.refresh_rect.top(),
-            "\N{clockwise gapped circle arrow}", self.font, "black"
-        ))
-        # New tab button
-        cmds.append(DrawOutline(self.newtab_rect, "black", 1))
-        cmds.append(DrawText(
-            self.newtab_rect.left() + self.padding,
-            self.newtab_rect.top(),
-            "+", self.font, "black"
-        ))
         # Bookmark button
-        if self.browser.active_tab.url.storage.get_bookmark(str(self.browser.active_tab.url)):
-            # If is bookmarked
+        if self.browser.active_tab_bookmarked:
             cmds.append(DrawRect(self.bookmark_rect, "yellow"))
         cmds.append(DrawOutline(self.bookmark_rect, "black", 1))
         cmds.append(DrawText(
@@ -128,11 +135,10 @@ class Chrome:
             "\N{white star}", self.font, "black"
         ))
         # Address bar
-        cmds.append(DrawOutline(self.address_rect, "black", 1))
         connection_type: str
-        if self.browser.active_tab.url.is_safe is None:
+        if self.browser.active_tab_url.is_safe is None:
             connection_type = "\N{circled information source}"
-        elif self.browser.active_tab.url.is_safe:
+        elif self.browser.active_tab_url.is_safe:
             connection_type = "\N{lock}"
         else:
             connection_type = "\N{open lock}"
@@ -157,7 +163,7 @@ class Chrome:
                 "red", 1
             ))
         else:
-            url = str(self.browser.active_tab.url)
+            url = str(self.browser.active_tab_url)
             cmds.append(DrawText(
                 self.address_rect.left() + ctw + self.padding,
                 self.address_rect.top(),
@@ -190,13 +196,17 @@ class Chrome:
         if self.newtab_rect.contains(x, y):
             self.browser.new_tab(URL("https://browser.engineering/"))
         elif self.back_rect.contains(x, y):
-            self.browser.active_tab.go_back()
+            tab = self.browser.active_tab
+            tab.schedule_task(tab.go_back)
         elif self.forward_rect.contains(x, y):
-            self.browser.active_tab.go_forward()
+            tab = self.browser.active_tab
+            tab.schedule_task(tab.go_forward)
         elif self.refresh_rect.contains(x, y):
-            self.browser.active_tab.refresh()
+            tab = self.browser.active_tab
+            tab.schedule_task(tab.refresh)
         elif self.bookmark_rect.contains(x, y):
-            self.browser.active_tab.toggle_bookmark()
+            tab = self.browser.active_tab
+            tab.schedule_task(tab.toggle_bookmark)
         elif self.address_rect.contains(x, y):
             self.focus = "address bar"
             self.address_bar = ""
@@ -204,8 +214,7 @@ class Chrome:
         else:
             for i, tab in enumerate(self.browser.tabs):
                 if self.tab_rect(i).contains(x, y):
-                    self.browser.active_tab = tab
-                    self.browser.update_title()
+                    self.browser.set_active_tab(tab)
                     break
     
     def keypress(self, char: str) -> bool:
@@ -234,8 +243,9 @@ class Chrome:
 
     def enter(self) -> bool:
         if self.focus == "address bar":
-            self.browser.active_tab.load(URL(self.address_bar))
-            self.browser.active_tab.clear_forward()
+            tab = self.browser.active_tab
+            tab.schedule_task(tab.load, URL(self.address_bar))
+            tab.schedule_task(tab.clear_forward)
             self.focus = None
             return True
         return False
@@ -0,0 +1,250 @@
+import math
+import skia
+import colorsys
+from string import hexdigits
+
+# Parsed colors are cached, so each color string is resolved once
+MAX_CACHED_COLORS = 4096
+NAMED_COLORS = {
+    "aliceblue": "#f0f8ff",
+    "antiquewhite": "#faebd7",
+    "aqua": "#00ffff",
+    "aquamarine": "#7fffd4",
+    "azure": "#f0ffff",
+    "beige": "#f5f5dc",
+    "bisque": "#ffe4c4",
+    "black": "#000000",
+    "blanchedalmond": "#ffebcd",
+    "blue": "#0000ff",
+    "blueviolet": "#8a2be2",
+    "brown": "#a52a2a",
+    "burlywood": "#deb887",
+    "cadetblue": "#5f9ea0",
+    "chartreuse": "#7fff00",
+    "chocolate": "#d2691e",
+    "coral": "#ff7f50",
+    "cornflowerblue": "#6495ed",
+    "cornsilk": "#fff8dc",
+    "crimson": "#dc143c",
+    "cyan": "#00ffff",
+    "darkblue": "#00008b",
+    "darkcyan": "#008b8b",
+    "darkgoldenrod": "#b8860b",
+    "darkgray": "#a9a9a9",
+    "darkgreen": "#006400",
+    "darkgrey": "#a9a9a9",
+    "darkkhaki": "#bdb76b",
+    "darkmagenta": "#8b008b",
+    "darkolivegreen": "#556b2f",
+    "darkorange": "#ff8c00",
+    "darkorchid": "#9932cc",
+    "darkred": "#8b0000",
+    "darksalmon": "#e9967a",
+    "darkseagreen": "#8fbc8f",
+    "darkslateblue": "#483d8b",
+    "darkslategray": "#2f4f4f",
+    "darkslategrey": "#2f4f4f",
+    "darkturquoise": "#00ced1",
+    "darkviolet": "#9400d3",
+    "deeppink": "#ff1493",
+    "deepskyblue": "#00bfff",
+    "dimgray": "#696969",
+    "dimgrey": "#696969",
+    "dodgerblue": "#1e90ff",
+    "firebrick": "#b22222",
+    "floralwhite": "#fffaf0",
+    "forestgreen": "#228b22",
+    "fuchsia": "#ff00ff",
+    "gainsboro": "#dcdcdc",
+    "ghostwhite": "#f8f8ff",
+    "gold": "#ffd700",
+    "goldenrod": "#daa520",
+    "gray": "#808080",
+    "green": "#008000",
+    "greenyellow": "#adff2f",
+    "grey": "#808080",
+    "honeydew": "#f0fff0",
+    "hotpink": "#ff69b4",
+    "indianred": "#cd5c5c",
+    "indigo": "#4b0082",
+    "ivory": "#fffff0",
+    "khaki": "#f0e68c",
+    "lavender": "#e6e6fa",
+    "lavenderblush": "#fff0f5",
+    "lawngreen": "#7cfc00",
+    "lemonchiffon": "#fffacd",
+    "lightblue": "#add8e6",
+    "lightcoral": "#f08080",
+    "lightcyan": "#e0ffff",
+    "lightgoldenrodyellow": "#fafad2",
+    "lightgray": "#d3d3d3",
+    "lightgreen": "#90ee90",
+    "lightgrey": "#d3d3d3",
+    "lightpink": "#ffb6c1",
+    "lightsalmon": "#ffa07a",
+    "lightseagreen": "#20b2aa",
+    "lightskyblue": "#87cefa",
+    "lightslategray": "#778899",
+    "lightslategrey": "#778899",
+    "lightsteelblue": "#b0c4de",
+    "lightyellow": "#ffffe0",
+    "lime": "#00ff00",
+    "limegreen": "#32cd32",
+    "linen": "#faf0e6",
+    "magenta": "#ff00ff",
+    "maroon": "#800000",
+    "mediumaquamarine": "#66cdaa",
+    "mediumblue": "#0000cd",
+    "mediumorchid": "#ba55d3",
+    "mediumpurple": "#9370db",
+    "mediumseagreen": "#3cb371",
+    "mediumslateblue": "#7b68ee",
+    "mediumspringgreen": "#00fa9a",
+    "mediumturquoise": "#48d1cc",
+    "mediumvioletred": "#c71585",
+    "midnightblue": "#191970",
+    "mintcream": "#f5fffa",
+    "mistyrose": "#ffe4e1",
+    "moccasin": "#ffe4b5",
+    "navajowhite": "#ffdead",
+    "navy": "#000080",
+    "oldlace": "#fdf5e6",
+    "olive": "#808000",
+    "olivedrab": "#6b8e23",
+    "orange": "#ffa500",
+    "orangered": "#ff4500",
+    "orchid": "#da70d6",
+    "palegoldenrod": "#eee8aa",
+    "palegreen": "#98fb98",
+    "paleturquoise": "#afeeee",
+    "palevioletred": "#db7093",
+    "papayawhip": "#ffefd5",
+    "peachpuff": "#ffdab9",
+    "peru": "#cd853f",
+    "pink": "#ffc0cb",
+    "plum": "#dda0dd",
+    "powderblue": "#b0e0e6",
+    "purple": "#800080",
+    "rebeccapurple": "#663399",
+    "red": "#ff0000",
+    "rosybrown": "#bc8f8f",
+    "royalblue": "#4169e1",
+    "saddlebrown": "#8b4513",
+    "salmon": "#fa8072",
+    "sandybrown": "#f4a460",
+    "seagreen": "#2e8b57",
+    "seashell": "#fff5ee",
+    "sienna": "#a0522d",
+    "silver": "#c0c0c0",
+    "skyblue": "#87ceeb",
+    "slateblue": "#6a5acd",
+    "slategray": "#708090",
+    "slategrey": "#708090",
+    "snow": "#fffafa",
+    "springgreen": "#00ff7f",
+    "steelblue": "#4682b4",
+    "tan": "#d2b48c",
+    "teal": "#008080",
+    "thistle": "#d8bfd8",
+    "tomato": "#ff6347",
+    "turquoise": "#40e0d0",
+    "violet": "#ee82ee",
+    "wheat": "#f5deb3",
+    "white": "#ffffff",
+    "whitesmoke": "#f5f5f5",
+    "yellow": "#ffff00",
+    "yellowgreen": "#9acd32",
+}
+ANGLE_UNITS = {
+    "deg": 1,
+    "grad": 360 / 400,
+    "rad": 180 / math.pi,
+    "turn": 360,
+}
+
+COLORS: dict[str, int | None] = {}
+# Cached value can be None for invalid colors, so missing entry is marked differently
+MISSING = object()
+
+def parse_color(color: str, default: skia.Color = skia.ColorBLACK) -> skia.Color:
+    resolved = resolve_color(color)
+    return default if resolved is None else resolved
+
+def is_color(value: str) -> bool:
+    # Style validation resolves colors under same string, which is later given to draw commands
+    return value.strip().casefold() == "currentcolor" or resolve_color(value) is not None
+
+def resolve_color(color: str) -> int | None:
+    cached = COLORS.get(color, MISSING)
+    if cached is not MISSING: return cached
+    if len(COLORS) >= MAX_CACHED_COLORS: COLORS.clear()
+    value = color.strip().casefold()
+    try:
+        resolved = parse_value(value)
+    except ValueError:
+        resolved = None
+    COLORS[color] = resolved
+    return resolved
+
+def parse_value(value: str) -> int | None:
+    if value == "transparent":
+        return skia.ColorTRANSPARENT
+    if value in NAMED_COLORS:
+        return parse_hex(NAMED_COLORS[value])
+    if value.startswith("#"):
+        return parse_hex(value)
+    if value.endswith(")") and "(" in value:
+        name, args = value[:-1].split("(", 1)
+        match name.strip():
+            case "rgb" | "rgba": return parse_rgb(args)
+            case "hsl" | "hsla": return parse_hsl(args)
+    return None
+
+def parse_hex(value: str) -> int | None:
+    digits = value[1:]
+    if not all(c in hexdigits for c in digits): return None
+    # Short forms are #rgb and #rgba
+    if len(digits) in (3, 4): digits = "".join(c * 2 for c in digits)
+    if len(digits) == 6: digits += "ff"
+    if len(digits) != 8: return None
+    r, g, b, a = (int(digits[i:i+2], 16) for i in range(0, 8, 2))
+    return skia.Color(r, g, b, a)
+
+def split_args(args: str) -> list[str]:
+    # Covers legacy `rgb(r, g, b, a)` and modern `rgb(r g b / a)` syntax
+    parts = args.replace(",", " ").replace("/", " ").split()
+    if len(parts) not in (3, 4): raise ValueError("Invalid color arguments")
+    return parts
+
+def parse_number(value: str, percent_scale: float) -> float:
+    if value.endswith("%"): number = float(value[:-1]) / 100 * percent_scale
+    else: number = float(value)
+    if not math.isfinite(number): raise ValueError("Invalid color number")
+    return number
+
+def parse_alpha(parts: list[str]) -> int:
+    if len(parts) < 4: return 255
+    alpha = min(max(parse_number(parts[3], 1), 0), 1)
+    return round(alpha * 255)
+
+def parse_rgb(args: str) -> skia.Color:
+    parts = split_args(args)
+    r, g, b = (round(min(max(parse_number(part, 255), 0), 255)) for part in parts[:3])
+    return skia.Color(r, g, b, parse_alpha(parts))
+
+def parse_hsl(args: str) -> skia.Color:
+    parts = split_args(args)
+    hue = parts[0]
+    for unit, scale in ANGLE_UNITS.items():
+        if hue.endswith(unit):
+            degrees = parse_number(hue.removesuffix(unit), 1) * scale
+            break
+    else: degrees = parse_number(hue, 1)
+    saturation, lightness = (min(max(parse_number(part, 100) / 100, 0), 1) for part in parts[1:3])
+    r, g, b = colorsys.hls_to_rgb((degrees % 360) / 360, lightness, saturation)
+    return skia.Color(round(r * 255), round(g * 255), round(b * 255), parse_alpha(parts))
+
+def color_to_string(color: skia.Color) -> str:
+    return "#{:02x}{:02x}{:02x}{:02x}".format(
+        skia.ColorGetR(color), skia.ColorGetG(color), skia.ColorGetB(color), skia.ColorGetA(color)
+    )
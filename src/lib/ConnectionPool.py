@@ -0,0 +1,127 @@
+import ssl
+import asyncio
+from time import time
+from .Trace import counter, tracing
+
+# Same limit as common browsers use for HTTP/1.1
+MAX_CONNECTIONS_PER_HOST = 6
+IDLE_TIMEOUT = 60 # seconds
+CONNECT_TIMEOUT = 10 # seconds
+IO_TIMEOUT = 30 # seconds, for every read or write
+
+# Loading certificates is slow, so one context is shared by all connections
+SSL_CONTEXT = ssl.create_default_context()
+
+connection_key = tuple[str, str, int]
+
+class Connection:
+    def __init__(self, key: connection_key, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.key: connection_key = key
+        # Reader is kept for whole connection, so bytes buffered past one response are not lost
+        self.reader: asyncio.StreamReader = reader
+        self.writer: asyncio.StreamWriter = writer
+        self.reused: bool = False
+        self.last_used: float = time()
+
+    def __repr__(self) -> str:
+        return "Connection({}://{}:{})".format(*self.key)
+
+    def is_alive(self) -> bool:
+        # Reader gets EOF, when server closes idle connection
+        return not self.reader.at_eof() and not self.writer.is_closing()
+
+    async def send(self, data: bytes) -> None:
+        self.writer.write(data)
+        await asyncio.wait_for(self.writer.drain(), IO_TIMEOUT)
+
+    async def readline(self) -> bytes:
+        return await asyncio.wait_for(self.reader.readline(), IO_TIMEOUT)
+
+    async def readexactly(self, n: int) -> bytes:
+        return await asyncio.wait_for(self.reader.readexactly(n), IO_TIMEOUT)
+
+    async def read(self, n: int) -> bytes:
+        # Returns empty bytes, when server has closed connection
+        return await asyncio.wait_for(self.reader.read(n), IO_TIMEOUT)
+
+    def close(self) -> None:
+        self.writer.close()
+
+async def connect(key: connection_key) -> Connection:
+    scheme, host, port = key
+    ctx = SSL_CONTEXT if scheme == "https" else None
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, port, ssl=ctx, server_hostname=host if ctx else None),
+        CONNECT_TIMEOUT
+    )
+    return Connection(key, reader, writer)
+
+class ConnectionPool:
+    # Used only from network loop, so requests wait for connections without blocking threads
+    def __init__(self, per_host: int = MAX_CONNECTIONS_PER_HOST, idle_timeout: float = IDLE_TIMEOUT) -> None:
+        self.per_host: int = per_host
+        self.idle_timeout: float = idle_timeout
+        # Semaphore wakes only one waiting request, when connection is released
+        self.slots: dict[connection_key, asyncio.Semaphore] = {}
+        # Most recently used connections come last
+        self.idle: dict[connection_key, list[Connection]] = {}
+        self.requests: int = 0
+        self.reused: int = 0
+
+    def __len__(self) -> int:
+        return sum(len(connections) for connections in list(self.idle.values()))
+
+    async def acquire(self, key: connection_key) -> Connection:
+        # Waits for other requests, when host has too many open connections
+        slots = self.slots.setdefault(key, asyncio.Semaphore(self.per_host))
+        await slots.acquire()
+        self.requests += 1
+        self.prune()
+        idle = self.idle.get(key, [])
+        while idle:
+            connection = idle.pop()
+            if connection.is_alive():
+                connection.reused = True
+                self.reused += 1
+                return connection
+            connection.close()
+        try:
+            return await connect(key)
+        except BaseException:
+            slots.release()
+            raise
+
+    def release(self, connection: Connection, reusable: bool) -> None:
+        connection.last_used = time()
+        if reusable:
+            self.idle.setdefault(connection.key, []).append(connection)
+        else:
+            connection.close()
+        self.slots[connection.key].release()
+        if tracing(): counter("connections", idle=len(self), reuse_rate=self.reuse_rate())
+
+    def prune(self) -> None:
+        now = time()
+        for key, connections in list(self.idle.items()):
+            for connection in [c for c in connections if now - c.last_used > self.idle_timeout]:
+                connections.remove(connection)
+                connection.close()
+            if not connections: self.idle.pop(key)
+
+    async def close(self) -> None:
+        # Coroutine, so it runs on network loop like other uses of pool
+        for connections in self.idle.values():
+            for connection in connections: connection.close()
+        self.idle.clear()
+
+    def reuse_rate(self) -> float:
+        if not self.requests: return 0.0
+        return self.reused / self.requests
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "requests": self.requests,
+            "reused": self.reused,
+            "idle": len(self),
+            "reuse_rate": self.reuse_rate(),
+        }
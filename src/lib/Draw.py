@@ -1,28 +1,13 @@
 import skia
-from pathlib import Path
 from abc import ABC, abstractmethod
-from . import BASE_DIR, IMAGE_CACHE
-
-EMOJIS_PATH = Path(BASE_DIR) / "assets" / "emojis"
-NAMED_COLORS = {
-    "black": "#000000",
-    "white": "#ffffff",
-    "red":   "#ff0000",
-    "blue": "#0000ff",
-    "green": "#00ff00",
-    "gray":	"#808080",
-    "grey":	"#808080",
-    "lightblue": "#add8e6",
-    "lightgreen": "#90ee90",
-    "orange": "#ffa500",
-    "orangered": "#ff4500",
-    "yellow": "#ffff00",
-    "purple": "#800080",
-    "silver": "#c0c0c0",
-    "lightgrey": "#d3d3d3",
-    "lightgray": "#d3d3d3",
-
-}
+from .Color import parse_color, color_to_string
+from .EmojiAtlas import find_emoji
+from .LayerCache import LayerCache, MAX_LAYER_PIXELS
+
+# Covers strokes and antialiasing outside of command rect
+CULL_OUTSET_PX = 2
+
+LAYER_CACHE = LayerCache()
 
 class Draw(ABC):
     def __init__(self, rect: skia.Rect, layout = None) -> None:
@@ -30,11 +15,28 @@ class Draw(ABC):
         assert isinstance(layout, Layout | None)
         self.layout: Layout | None = layout
         self.rect: skia.Rect = rect
+        self.hash: int | None = None
+        self.relative: int | None = None
 
     @abstractmethod
     def execute(self, canvas: skia.Canvas) -> None:
         pass
 
+    @abstractmethod
+    def key(self, dx: float, dy: float) -> tuple:
+        # Identifies drawn content relative to (dx, dy), so moved content has same key
+        pass
+
+    def content_hash(self) -> int:
+        # Commands do not change after paint, so hash is computed once
+        if self.hash is None: self.hash = hash(self.key(0, 0))
+        return self.hash
+
+    def relative_hash(self) -> int:
+        # Hash of content relative to its rect, so moved content has same hash
+        if self.relative is None: self.relative = hash(self.key(self.rect.left(), self.rect.top()))
+        return self.relative
+
 class DrawText(Draw):
     def __init__(self, 
     x1: int, 
@@ -44,45 +46,43 @@ class DrawText(Draw):
     color: str,
     layout = None, 
     ) -> None:
-        from .Layout import linespace
+        from .Layout import linespace, measure_text
         self.font: skia.Font = font
         self.text: str = text
         rect = skia.Rect.MakeLTRB(
             x1, y1,
-            x1 + font.measureText(self.text),
+            x1 + measure_text(font, self.text),
             y1 + linespace(self.font)
         )
         super().__init__(rect=rect, layout=layout)
-        self.color: str = color
+        # Colors from style were resolved, when style was computed, so this only reads cache
+        self.color: skia.Color = parse_color(color)
         # Emoji handling
-        self.image: skia.Image | None = None
-        if len(self.text) == 1 and not self.text.isalnum() and not self.text.isascii():
-            code = hex(ord(self.text))[2:].upper()
-            if code in IMAGE_CACHE:
-                self.image = IMAGE_CACHE[code]
-            else:
-                path = EMOJIS_PATH / "{}.png".format(code)
-                if path.is_file():
-                    self.image = skia.Image.open(str(path))
-                    IMAGE_CACHE[code] = self.image
+        self.emoji: tuple[skia.Image, skia.Rect] | None = find_emoji(self.text)
 
     def __repr__(self) -> str:
         return "DrawText(r'{}' l'{}' / c'{}')".format(
-            self.rect, self.layout, self.color 
+            self.rect, self.layout, color_to_string(self.color)
         )
 
     def execute(self, canvas: skia.Canvas) -> None:
-        if self.image: # Draws Emojis
-            canvas.drawImage(self.image, self.rect.left()-1, self.rect.top()+1)
+        if self.emoji: # Draws Emojis
+            image, src = self.emoji
+            dst = skia.Rect.MakeXYWH(self.rect.left()-1, self.rect.top()+1, src.width(), src.height())
+            canvas.drawImageRect(image, src, dst)
             return
         # Draws text
         paint = skia.Paint(
             AntiAlias=True,
-            Color=parse_color(self.color)
+            Color=self.color
         )
         baseline = self.rect.top() - self.font.getMetrics().fAscent
         canvas.drawString(self.text, float(self.rect.left()), baseline, self.font, paint)
 
+    def key(self, dx: float, dy: float) -> tuple:
+        font = (self.font.getTypeface().uniqueID(), self.font.getSize())
+        return ("text", rect_key(self.rect, dx, dy), self.text, font, self.color)
+
 class DrawRect(Draw):
     def __init__(self, 
     rect: skia.Rect, 
@@ -90,19 +90,22 @@ class DrawRect(Draw):
     layout = None, 
     ) -> None:
         super().__init__(rect=rect, layout=layout)
-        self.color: str = color
+        self.color: skia.Color = parse_color(color, skia.ColorWHITE)
 
     def __repr__(self) -> str:
         return "DrawRect(r'{}' l'{}' / c'{}')".format(
-            self.rect, self.layout, self.color 
+            self.rect, self.layout, color_to_string(self.color)
         )
 
     def execute(self, canvas: skia.Canvas) -> None:
         paint = skia.Paint(
-            Color=parse_color(self.color, skia.ColorWHITE)
+            Color=self.color
         )
         canvas.drawRect(self.rect, paint)
 
+    def key(self, dx: float, dy: float) -> tuple:
+        return ("rect", rect_key(self.rect, dx, dy), self.color)
+
 class DrawRRect(Draw):
     def __init__(self, 
     rect: skia.Rect, 
@@ -111,20 +114,24 @@ class DrawRRect(Draw):
     layout = None, 
     ) -> None:
         super().__init__(rect=rect, layout=layout)
+        self.radius: float = radius
         self.rrect = skia.RRect.MakeRectXY(self.rect, radius, radius)
-        self.color: str = color
+        self.color: skia.Color = parse_color(color, skia.ColorWHITE)
 
     def __repr__(self) -> str:
         return "DrawRRect(r'{}' l'{}' / c'{}')".format(
-            self.rect, self.layout, self.color
+            self.rect, self.layout, color_to_string(self.color)
         )
 
     def execute(self, canvas: skia.Canvas) -> None:
         paint = skia.Paint(
-            Color=parse_color(self.color, skia.ColorWHITE)
+            Color=self.color
         )
         canvas.drawRRect(self.rrect, paint)
 
+    def key(self, dx: float, dy: float) -> tuple:
+        return ("rrect", rect_key(self.rect, dx, dy), self.radius, self.color)
+
 class DrawOutline(Draw):
     def __init__(self, 
     rect: skia.Rect, 
@@ -133,22 +140,25 @@ class DrawOutline(Draw):
     layout = None, 
     ) -> None:
         super().__init__(rect=rect, layout=layout)
-        self.color: str = color
+        self.color: skia.Color = parse_color(color)
         self.thikness: int = thikness
 
     def __repr__(self) -> str:
         return "DrawOutline(r'{}' l'{}' / c'{}' t{})".format(
-            self.rect, self.layout, self.color, self.thikness
+            self.rect, self.layout, color_to_string(self.color), self.thikness
         )
 
     def execute(self, canvas: skia.Canvas) -> None:
         paint = skia.Paint(
-            Color=parse_color(self.color),
+            Color=self.color,
             StrokeWidth=self.thikness,
             Style=skia.Paint.kStroke_Style
         )
         canvas.drawRect(self.rect, paint)
 
+    def key(self, dx: float, dy: float) -> tuple:
+        return ("outline", rect_key(self.rect, dx, dy), self.color, self.thikness)
+
 class DrawLine(Draw):
     def __init__(self, 
     x1: int, 
@@ -161,12 +171,12 @@ class DrawLine(Draw):
     ) -> None:
         rect = skia.Rect.MakeLTRB(x1, y1, x2, y2)
         super().__init__(rect=rect, layout=layout)
-        self.color: str = color
+        self.color: skia.Color = parse_color(color)
         self.thikness: int = thikness
 
     def __repr__(self) -> str:
         return "DrawLine(r'{}' l'{}' / c'{}')".format(
-            self.rect, self.layout, self.color
+            self.rect, self.layout, color_to_string(self.color)
         )
 
     def execute(self, canvas: skia.Canvas) -> None:
@@ -176,12 +186,15 @@ class DrawLine(Draw):
             self.rect.right(), self.rect.bottom()
         )
         paint = skia.Paint(
-            Color=parse_color(self.color),
+            Color=self.color,
             StrokeWidth=self.thikness,
             Style=skia.Paint.kStroke_Style
         )
         canvas.drawPath(path, paint)
 
+    def key(self, dx: float, dy: float) -> tuple:
+        return ("line", rect_key(self.rect, dx, dy), self.color, self.thikness)
+
 class Blend(Draw):
     def __init__(
     self, 
@@ -198,8 +211,13 @@ class Blend(Draw):
         self.blur: float = blur
         self.should_save: bool = bool(self.blend_mode) or self.opacity < 1 or self.blur > 0
         self.children: list[Draw] = children
+        self.children_relative: int | None = None
         for cmd in self.children:
             self.rect.join(cmd.rect)
+        # Effects are composited from cached layer, instead of reexecuting children
+        self.cacheable: bool = self.should_save and \
+            self.blend_mode != "destination-in" and \
+            not self.rect.isEmpty()
         
     def __repr__(self) -> str:
         return "Blend(r'{}' l'{}' / o'{}' b'{}')".format(
@@ -207,35 +225,139 @@ class Blend(Draw):
         )
 
     def execute(self, canvas: skia.Canvas) -> None:
+        if not self.should_save:
+            self.execute_children(canvas)
+            return
         paint = skia.Paint(
             Alphaf=self.opacity,
             BlendMode=parse_blend_mode(self.blend_mode),
-            ImageFilter=skia.ImageFilters.Blur(self.blur, self.blur),
         )
-        if self.should_save:
+        if self.blur > 0:
+            paint.setImageFilter(skia.ImageFilters.Blur(self.blur, self.blur))
+        bounds = self.rect.makeOutset(CULL_OUTSET_PX, CULL_OUTSET_PX).roundOut()
+        if not self.cacheable or bounds.width() * bounds.height() > MAX_LAYER_PIXELS:
             canvas.saveLayer(None, paint)
+            self.execute_children(canvas)
+            canvas.restore()
+            return
+        canvas.drawImage(self.layer(bounds), bounds.left(), bounds.top(), paint=paint)
+
+    def execute_children(self, canvas: skia.Canvas) -> None:
         for cmd in self.children:
+            if quick_reject(canvas, cmd): continue
             cmd.execute(canvas)
-        if self.should_save:
-            canvas.restore()
 
-def parse_color(color: str, default: skia.Color = skia.ColorBLACK) -> skia.Color:
-    if color.startswith("#") and len(color) == 7:
-        r = int(color[1:3], 16)
-        g = int(color[3:5], 16)
-        b = int(color[5:7], 16)
-        return skia.Color(r, g, b)
-    elif color.startswith("#") and len(color) == 9:
-        r = int(color[1:3], 16)
-        g = int(color[3:5], 16)
-        b = int(color[5:7], 16)
-        a = int(color[7:9], 16)
-        return skia.Color(r, g, b, a)
-    elif color in NAMED_COLORS:
-        return parse_color(NAMED_COLORS[color])
-    else:
-        return default
-    
+    def layer(self, bounds: skia.IRect) -> skia.Image:
+        # Effects and position are left out, so changing them reuses cached layer
+        key = (
+            bounds.width(), bounds.height(),
+            bounds.left() - self.rect.left(), bounds.top() - self.rect.top(),
+            self.children_hash(),
+        )
+        image = LAYER_CACHE.get(key)
+        if image is None:
+            surface = skia.Surface(bounds.width(), bounds.height())
+            canvas = surface.getCanvas()
+            canvas.clear(skia.ColorTRANSPARENT)
+            canvas.translate(-bounds.left(), -bounds.top())
+            self.execute_children(canvas)
+            image = surface.makeImageSnapshot()
+            LAYER_CACHE.put(key, image)
+        return image
+
+    def key(self, dx: float, dy: float) -> tuple:
+        return self.effect_key() + tuple(cmd.key(dx, dy) for cmd in self.children)
+
+    def effect_key(self) -> tuple:
+        return ("blend", self.opacity, self.blend_mode, self.blur)
+
+    def content_hash(self) -> int:
+        # Built from hashes of children, so nested groups are hashed only once
+        if self.hash is None:
+            self.hash = hash(self.effect_key() + tuple(cmd.content_hash() for cmd in self.children))
+        return self.hash
+
+    def relative_hash(self) -> int:
+        if self.relative is None: self.relative = hash(self.effect_key() + (self.children_hash(),))
+        return self.relative
+
+    def children_hash(self) -> int:
+        # Built from memoized hashes of children and their offsets, so nested groups are hashed only once
+        if self.children_relative is None:
+            left, top = self.rect.left(), self.rect.top()
+            self.children_relative = hash(tuple(
+                (cmd.relative_hash(), cmd.rect.left() - left, cmd.rect.top() - top)
+                for cmd in self.children
+            ))
+        return self.children_relative
+
+def rect_key(rect: skia.Rect, dx: float, dy: float) -> tuple[float, float, float, float]:
+    return (rect.left() - dx, rect.top() - dy, rect.right() - dx, rect.bottom() - dy)
+
+def record(cmds: list[Draw], bounds: skia.Rect) -> skia.Picture:
+    recorder = skia.PictureRecorder()
+    canvas = recorder.beginRecording(bounds)
+    for cmd in cmds:
+        cmd.execute(canvas)
+    return recorder.finishRecordingAsPicture()
+
+def quick_reject(canvas: skia.Canvas, cmd: Draw) -> bool:
+    # Checks if command can be skipped, because it is outside of canvas clip
+    if cmd.rect.isEmpty(): return False
+    # Destination blending affects pixels outside of its rect
+    if isinstance(cmd, Blend) and cmd.blend_mode == "destination-in": return False
+    return canvas.quickReject(paint_rect(cmd))
+
+def paint_rect(cmd: Draw, outset: float = 0) -> skia.Rect:
+    # Area of pixels, that command can change
+    outset += CULL_OUTSET_PX
+    if isinstance(cmd, Blend): outset += 3 * cmd.blur
+    return cmd.rect.makeOutset(outset, outset)
+
+def damage(old: list[Draw], new: list[Draw], outset: float = 0) -> list[skia.Rect]:
+    # Areas of commands, that are only in one of display lists
+    # Identical commands can repeat, so they are counted instead of collapsed into one
+    old_cmds = commands_by_hash(old)
+    new_cmds = commands_by_hash(new)
+    removed: list[Draw] = []
+    added: list[Draw] = []
+    for key, cmds in old_cmds.items():
+        removed.extend(cmds[len(new_cmds.get(key, [])):])
+    for key, cmds in new_cmds.items():
+        added.extend(cmds[len(old_cmds.get(key, [])):])
+    rects: list[skia.Rect] = []
+    # Changed groups of same layout object are diffed by their children,
+    # so one changed element does not damage whole group around it
+    old_groups: dict[tuple, Blend] = {}
+    for cmd in removed:
+        key = group_key(cmd)
+        if key is None or key in old_groups: rects.append(paint_rect(cmd, outset))
+        else: old_groups[key] = cmd # type: ignore
+    for cmd in added:
+        key = group_key(cmd)
+        previous = old_groups.pop(key, None) if key is not None else None
+        if previous is not None and previous.effect_key() == cmd.effect_key(): # type: ignore
+            rects.extend(damage(previous.children, cmd.children, outset + 3 * cmd.blur)) # type: ignore
+            continue
+        if previous is not None: rects.append(paint_rect(previous, outset))
+        rects.append(paint_rect(cmd, outset))
+    rects.extend(paint_rect(cmd, outset) for cmd in old_groups.values())
+    return rects
+
+def commands_by_hash(cmds: list[Draw]) -> dict[int, list[Draw]]:
+    grouped: dict[int, list[Draw]] = {}
+    for cmd in cmds:
+        grouped.setdefault(cmd.content_hash(), []).append(cmd)
+    return grouped
+
+def group_key(cmd: Draw) -> tuple | None:
+    # Nodes outlive layout, so group is matched with group of same node in previous display list
+    if not isinstance(cmd, Blend) or cmd.layout is None: return None
+    if cmd.blend_mode == "destination-in": return None
+    node = cmd.layout.node
+    nodes = node if isinstance(node, list) else [node]
+    return (type(cmd.layout).__name__,) + tuple(id(node) for node in nodes)
+
 def parse_blend_mode(blend_mode_str: str) -> skia.BlendMode:
     match blend_mode_str:
         case "multiply": return skia.BlendMode.kMultiply
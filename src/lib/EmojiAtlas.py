@@ -0,0 +1,91 @@
+import json
+import mmap
+import math
+import skia
+from pathlib import Path
+from . import BASE_DIR, IMAGE_CACHE
+
+EMOJIS_PATH = Path(BASE_DIR) / "assets" / "emojis"
+ATLAS_PATH = Path(BASE_DIR) / "assets" / "emojis.atlas"
+ATLAS_INDEX_PATH = Path(BASE_DIR) / "assets" / "emojis.json"
+ATLAS_COLUMNS = 64
+# Matches decoded pngs, so atlas pixels are drawn without conversion
+ATLAS_COLOR_TYPE = skia.kBGRA_8888_ColorType
+
+class EmojiAtlas:
+    def __init__(self, image: skia.Image, rects: dict[str, skia.Rect], pixels: mmap.mmap | None = None) -> None:
+        self.image: skia.Image = image
+        self.rects: dict[str, skia.Rect] = rects
+        # Mapped file backs image pixels, so it has to stay open
+        self.pixels: mmap.mmap | None = pixels
+
+    def __len__(self) -> int:
+        return len(self.rects)
+
+    def get(self, code: str) -> skia.Rect | None:
+        return self.rects.get(code)
+
+    @staticmethod
+    def load(atlas_path: Path = ATLAS_PATH, index_path: Path = ATLAS_INDEX_PATH) -> 'EmojiAtlas | None':
+        if not atlas_path.is_file() or not index_path.is_file(): return None
+        with open(index_path, "r") as file:
+            index = json.load(file)
+        info = skia.ImageInfo.Make(index["width"], index["height"], ATLAS_COLOR_TYPE, skia.kPremul_AlphaType)
+        with open(atlas_path, "rb") as file:
+            pixels = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(pixels) < info.computeMinByteSize(): return None
+        image = skia.Image.MakeRasterData(info, skia.Data.MakeWithoutCopy(pixels), info.minRowBytes())
+        rects = {code: skia.Rect.MakeXYWH(*rect) for code, rect in index["emojis"].items()}
+        return EmojiAtlas(image, rects, pixels)
+
+    @staticmethod
+    def pack(emojis_path: Path = EMOJIS_PATH, atlas_path: Path = ATLAS_PATH, index_path: Path = ATLAS_INDEX_PATH) -> 'EmojiAtlas':
+        images = {path.stem.upper(): skia.Image.open(str(path)) for path in sorted(emojis_path.glob("*.png"))}
+        if not images: raise Exception("No emojis found in {}".format(emojis_path))
+        cell_width = max(image.width() for image in images.values())
+        cell_height = max(image.height() for image in images.values())
+        columns = min(ATLAS_COLUMNS, len(images))
+        rows = math.ceil(len(images) / columns)
+        info = skia.ImageInfo.Make(columns * cell_width, rows * cell_height, ATLAS_COLOR_TYPE, skia.kPremul_AlphaType)
+        surface = skia.Surface.MakeRaster(info)
+        canvas = surface.getCanvas()
+        canvas.clear(skia.ColorTRANSPARENT)
+        rects: dict[str, skia.Rect] = {}
+        for i, (code, image) in enumerate(images.items()):
+            x = (i % columns) * cell_width
+            y = (i // columns) * cell_height
+            canvas.drawImage(image, x, y)
+            rects[code] = skia.Rect.MakeXYWH(x, y, image.width(), image.height())
+        image = surface.makeImageSnapshot()
+        with open(atlas_path, "wb") as file:
+            file.write(image.tobytes())
+        with open(index_path, "w") as file:
+            json.dump({
+                "width": info.width(),
+                "height": info.height(),
+                "emojis": {code: [int(r.x()), int(r.y()), int(r.width()), int(r.height())] for code, r in rects.items()},
+            }, file)
+        return EmojiAtlas(image, rects)
+
+ATLAS: EmojiAtlas | None = None
+ATLAS_LOADED: bool = False
+
+def find_emoji(text: str) -> tuple[skia.Image, skia.Rect] | None:
+    global ATLAS, ATLAS_LOADED
+    if len(text) != 1 or text.isalnum() or text.isascii(): return None
+    code = hex(ord(text))[2:].upper()
+    # Atlas is mapped once, so emojis need no file access after that
+    if not ATLAS_LOADED:
+        ATLAS = EmojiAtlas.load()
+        ATLAS_LOADED = True
+    if ATLAS is not None:
+        rect = ATLAS.get(code)
+        if rect is None: return None
+        return ATLAS.image, rect
+    # Falls back to separate pngs, when atlas is not built
+    if code not in IMAGE_CACHE:
+        path = EMOJIS_PATH / "{}.png".format(code)
+        if not path.is_file(): return None
+        IMAGE_CACHE[code] = skia.Image.open(str(path))
+    image = IMAGE_CACHE[code]
+    return image, skia.Rect.MakeWH(image.width(), image.height())
@@ -63,13 +63,16 @@ class HTMLParser:
         self.unfinished: list[Element] = []
         self.open_formatting_tags: list[str] = []
         self.in_pre = False
+        # Tokenizer state is kept between fed chunks
+        self.text: str = ""
+        self.in_tag: bool = False
+        self.in_comment: bool = False
+        self.in_script: bool = False
 
-    def parse(self) -> Element:
-        text = ""
-        in_tag = False
-        in_comment = False
-        in_script = False
-        for c in self.body:
+    def feed(self, body: str) -> None:
+        # Parses part of body, tag or text split between chunks is finished by next one
+        text, in_tag, in_comment, in_script = self.text, self.in_tag, self.in_comment, self.in_script
+        for c in body:
             if in_comment:
                 text += c
                 if text.endswith("-->"):
@@ -99,8 +102,12 @@ class HTMLParser:
             else:
                 text += c
                 if in_tag and text.startswith("!--"): in_comment = True
-        if not in_tag and not in_comment and text:
-            self.add_text(text)
+        self.text, self.in_tag, self.in_comment, self.in_script = text, in_tag, in_comment, in_script
+
+    def parse(self) -> Element:
+        self.feed(self.body)
+        if not self.in_tag and not self.in_comment and self.text:
+            self.add_text(self.text)
         return self.finish()
 
     def add_text(self, text: str) -> None:
@@ -2,6 +2,7 @@ import dukpy
 from typing import Any
 from pathlib import Path
 from .URL import parse_cookie
+from .Trace import span
 from .CSSParser import CSSParser
 from . import BASE_DIR, COOKIE_JAR
 from .HTMLParser import HTMLParser, Element, Text, parse_to_html
@@ -49,7 +50,8 @@ class JSContext:
     
     def run(self, script: str, code: str) -> Any | None:
         try:
-            return self.interp.evaljs(code)
+            with span("run_script", "js", script=script):
+                return self.interp.evaljs(code)
         except dukpy.JSRuntimeError as e:
             print("Script", script, "crashed", e)
 
@@ -91,7 +93,7 @@ class JSContext:
         self.add_tree_id(child)
         # Loads new content
         self.load_new_content([child])
-        self.tab.render()
+        self.tab.set_needs_render()
 
     def insertBefore(self, h_elt: int, h_insert: int) -> None:
         elt = self.handle_to_node[h_elt]
@@ -106,7 +108,7 @@ class JSContext:
         self.add_tree_id(insert)
         # Loads new content
         self.load_new_content([insert])
-        self.tab.render()
+        self.tab.set_needs_render()
 
     def removeChild(self, h_parent: int, h_child: int) -> int | None:
         child = self.handle_to_node[h_child]
@@ -116,7 +118,7 @@ class JSContext:
         child.parent = None
         self.remove_tree_id(child)
         self.remove_old_content([child])
-        self.tab.render()
+        self.tab.set_needs_render()
         return h_child
 
     def innerHTML_get(self, handle: int) -> str:
@@ -143,7 +145,7 @@ class JSContext:
             child.parent = elt
         # Loads new content
         self.load_new_content(new_nodes)
-        self.tab.render()
+        self.tab.set_needs_render()
 
     def outerHTML_get(self, handle: int) -> str:
         node = self.handle_to_node[handle]
@@ -169,7 +171,7 @@ class JSContext:
         self.removeChild(h_parent, handle)
         # Loads new content
         self.load_new_content(new_nodes)
-        self.tab.render()
+        self.tab.set_needs_render()
 
     def children_get(self, handle: int) -> list[int]:
         node = self.handle_to_node[handle]
@@ -191,8 +193,10 @@ class JSContext:
     def id_set(self, handle: int, s: str) -> None:
         node = self.handle_to_node[handle]
         self.remove_id_var(node)
+        # Styles and id index of layout depend on ids
+        self.tab.set_needs_render()
         if not s: 
-            node.attributes.pop("id")
+            node.attributes.pop("id", None)
             return
         node.attributes["id"] = s
         self.add_id_var(node)
@@ -218,7 +222,8 @@ class JSContext:
 
     def dispatch_event(self, type: str, elt: Element) -> bool:
         handle: int = self.get_handle(elt)
-        do_default = self.interp.evaljs(EVENT_DISPATCH_JS, type=type, handle=handle)
+        with span("dispatch_event", "js", type=type):
+            do_default = self.interp.evaljs(EVENT_DISPATCH_JS, type=type, handle=handle)
         return not do_default
 
     def XMLHttpRequest_send(self, method: str, url: str, body: str | None) -> str:
@@ -0,0 +1,51 @@
+import skia
+from collections import OrderedDict
+
+LAYER_CACHE_BUDGET = 32 * 1024 * 1024
+# Bigger layers are composited with saveLayer, instead of being cached
+MAX_LAYER_PIXELS = 2048 * 2048
+
+layer_key = tuple
+
+class LayerCache:
+    def __init__(self, budget: int = LAYER_CACHE_BUDGET) -> None:
+        self.budget: int = budget
+        # Least recently used layers come first
+        self.layers: OrderedDict[layer_key, skia.Image] = OrderedDict()
+        self.bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self.layers)
+
+    def size(self) -> int:
+        return self.bytes
+
+    def clear(self) -> None:
+        self.layers.clear()
+        self.bytes = 0
+
+    def reset_counters(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: layer_key) -> skia.Image | None:
+        image = self.layers.get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.layers.move_to_end(key)
+        return image
+
+    def put(self, key: layer_key, image: skia.Image) -> None:
+        if key in self.layers: return
+        self.layers[key] = image
+        self.bytes += image_bytes(image)
+        while self.bytes > self.budget and len(self.layers) > 1:
+            _, evicted = self.layers.popitem(last=False)
+            self.bytes -= image_bytes(evicted)
+
+def image_bytes(image: skia.Image) -> int:
+    return image.width() * image.height() * 4
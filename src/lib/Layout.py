@@ -6,10 +6,22 @@ from typing import Any, Generic, Literal, TypeVar, TypedDict
 
 INPUT_WIDTH_PX = 200
 CHECKBOX_WIDTH_PX = 20
+# Blocks with `content-visibility: auto` closer than this to viewport are laid out
+CONTENT_VISIBILITY_MARGIN_PX = 600
 FONTS: dict[
     tuple[Literal['normal', 'bold'], Literal['roman', 'italic']], 
+    skia.Typeface
+] = {}
+# Fonts are immutable once created, so every layout object shares them
+SIZED_FONTS: dict[
+    tuple[Literal['normal', 'bold'], Literal['roman', 'italic'], int], 
     skia.Font
 ] = {}
+# Shared by all leaf layouts instead of an empty list per word
+NO_CHILDREN: tuple = ()
+# Metrics and word widths per font, reused on every relayout
+MEASUREMENTS: dict[int, tuple[skia.Font, skia.FontMetrics, dict[str, float]]] = {}
+MAX_CACHED_WIDTHS = 50_000
 
 word_options = dict[str, Any]
 line_display = tuple[int, str, skia.Font, word_options]
@@ -25,9 +37,11 @@ class Dimensions(TypedDict):
 T = TypeVar("T", bound="Element | Text")
 
 class Layout(ABC, Generic[T]): 
+    __slots__ = ("node", "parent", "children", "x", "y", "width", "height")
+
     def __init__(self) -> None:
         self.node: T | list[T]
-        self.children: list
+        self.children: list | tuple
         self.x: int
         self.y: int
         self.width: int
@@ -47,17 +61,26 @@ class Layout(ABC, Generic[T]):
 
     @abstractmethod
     def paint_effects(self, cmds: list[Draw]):
+        # Group keeps its layout object, so it is matched when display lists are diffed
         cmds = paint_visual_effects(
-            self.node, cmds, self.self_rect()  # type: ignore
+            self.node, cmds, self.self_rect(), self  # type: ignore
         )
         return cmds
 
 class DocumentLayout(Layout):
-    def __init__(self, node: Element, dimensions: Dimensions) -> None:
+    __slots__ = ("dimensions", "scroll", "skipped", "layouts", "ids")
+
+    def __init__(self, node: Element, dimensions: Dimensions, scroll: float = 0) -> None:
         self.node: Element = node
         self.parent = None
         self.children: list[BlockLayout] = []
         self.dimensions: Dimensions = dimensions
+        self.scroll: float = scroll
+        # Blocks which contents were skipped by `content-visibility`
+        self.skipped: list[BlockLayout] = []
+        # Indexes filled during layout
+        self.layouts: dict[Element | Text, Layout] = {}
+        self.ids: dict[str, Element] = {}
         # ---
         self.x: int
         self.y: int
@@ -68,7 +91,7 @@ class DocumentLayout(Layout):
         return "DocumentLayout"
 
     def layout(self) -> None:
-        child = BlockLayout(self.node, self, None, self.dimensions)
+        child = BlockLayout(self.node, self, None)
         self.children.append(child)
         self.width = self.dimensions['width'] - 2*self.dimensions["hstep"]
         self.x = self.dimensions["hstep"]
@@ -87,20 +110,53 @@ class DocumentLayout(Layout):
 
     def self_rect(self) -> skia.Rect:
         return skia.Rect.MakeXYWH(self.x, self.y, self.width, self.height)
+
+    def index(self, node: Element | Text, layout: Layout, replace: bool = False) -> None:
+        # First layout object of node is kept, unless it is replaced
+        previous = self.layouts.get(node)
+        # Nodes of anonymous block are indexed again to their lines, so they are found more precisely
+        if not replace and previous is not None \
+        and not (isinstance(previous, BlockLayout) and isinstance(previous.node, list)): return
+        self.layouts[node] = layout
+        if isinstance(node, Element) and "id" in node.attributes:
+            self.ids.setdefault(node.attributes["id"], node)
+
+    def needs_layout(self, scroll: float) -> bool:
+        # Checks if any skipped content would be laid out at given scroll
+        return any(self.is_revealed(block, scroll) for block in self.skipped)
+
+    def is_revealed(self, block: 'BlockLayout', scroll: float) -> bool:
+        bottom = scroll + self.dimensions["height"] + CONTENT_VISIBILITY_MARGIN_PX
+        return block.y <= bottom and block.node.style.get("content-visibility") == "auto" # type: ignore
+
+    def reveal(self, scroll: float) -> None:
+        # All skipped blocks near viewport are laid out in one pass,
+        # rest of document is only moved by change of their heights
+        self.scroll = scroll
+        for block in list(self.skipped):
+            # Earlier blocks could move this one out of reach
+            if not self.is_revealed(block, scroll): continue
+            self.skipped.remove(block)
+            height = block.height
+            block.layout()
+            block.shift_following(block.height - height)
     
 class BlockLayout(Layout):
+    __slots__ = ("previous", "document", "cursor_x", "text_align")
+
     def __init__(
             self, 
             node: Element | Text | list[Element | Text], 
             parent: 'BlockLayout | DocumentLayout', 
             previous: 'BlockLayout | None',
-            dimensions: Dimensions
         ) -> None:
-        self.dimensions: Dimensions = dimensions
+        self.document: DocumentLayout = parent if isinstance(parent, DocumentLayout) else parent.document
         self.node: Element | Text | list[Element | Text] = node
         if isinstance(self.node, list):
             if len(self.node) == 0: raise ValueError("Cannot passd empty list as node argument")
             if len(self.node) == 1: [self.node] = self.node
+        for n in self.node if isinstance(self.node, list) else [self.node]:
+            self.document.index(n, self, replace=True)
         self.parent: 'BlockLayout | DocumentLayout' = parent
         self.previous: 'BlockLayout | None' = previous
         self.children: 'list[BlockLayout | LineLayout]' = []
@@ -137,10 +193,15 @@ class BlockLayout(Layout):
         if isinstance(self.node, Element):
             match self.node.tag:
                 case "li":
-                    self.x += self.dimensions["hstep"]
+                    self.x += self.document.dimensions["hstep"]
                 case "nav":
                     if self.node.attributes.get("id") == "toc":
-                        self.y += self.dimensions["vstep"]
+                        self.y += self.document.dimensions["vstep"]
+        # Skips contents by `content-visibility`
+        if self.skips_contents():
+            self.height = intrinsic_height(self.node) # type: ignore
+            self.document.skipped.append(self)
+            return
         # ---
         mode = self.layout_mode()
         if mode == "block":
@@ -149,10 +210,11 @@ class BlockLayout(Layout):
             block = []
             for child in self.node.children:
                 if isinstance(child, Element) and (child.tag in HEAD_TAGS + ["head"]): continue
+                if isinstance(child, Element) and child.style.get("display") == "none": continue
                 if isinstance(child, Element) and child.style.get("display") == "block":
                     # Add block of elements
                     if block:
-                        next = BlockLayout(block, self, previous, self.dimensions)
+                        next = BlockLayout(block, self, previous)
                         self.children.append(next)
                         previous = next
                         block = []
@@ -164,19 +226,19 @@ class BlockLayout(Layout):
                         heading = self.children.pop()
                         assert isinstance(heading.node, Element)
                         assert isinstance(heading, BlockLayout)
-                        next = BlockLayout([heading.node, child], self, heading.previous, self.dimensions)
+                        next = BlockLayout([heading.node, child], self, heading.previous)
                         self.children.append(next)
                         previous = next
                         continue
                     # Add block element
-                    next = BlockLayout(child, self, previous, self.dimensions)
+                    next = BlockLayout(child, self, previous)
                     self.children.append(next)
                     previous = next
                 else:
                     block.append(child)
             # Adds last block of elements
             if block:
-                next = BlockLayout(block, self, previous, self.dimensions)
+                next = BlockLayout(block, self, previous)
                 self.children.append(next)
                 previous = next
                 block = []
@@ -188,16 +250,42 @@ class BlockLayout(Layout):
         for child in self.children:
             child.layout()
         # Block height
-        if not isinstance(self.node, list) and \
-        self.node.style.get("height", "auto") != "auto" and \
-        self.node.style["height"].endswith("px"):
-            self.height =  int(self.node.style["height"][:-2])
+        if self.has_fixed_height():
+            self.height =  int(self.node.style["height"][:-2]) # type: ignore
         else:
             self.height = sum([child.height for child in self.children])
         # <p> bottom padding
         if isinstance(self.node, Element) and self.node.tag == "p":
-            self.height += self.dimensions["vstep"]
+            self.height += self.document.dimensions["vstep"]
         
+    def has_fixed_height(self) -> bool:
+        return not isinstance(self.node, list) and \
+            self.node.style.get("height", "auto") != "auto" and \
+            self.node.style["height"].endswith("px")
+
+    def shift_following(self, dy: float) -> None:
+        # Moves layout after this block, when its height has changed
+        child: BlockLayout = self
+        parent = self.parent
+        while dy and isinstance(parent, BlockLayout):
+            for sibling in parent.children[parent.children.index(child) + 1:]:
+                shift_layout(sibling, dy)
+            if parent.has_fixed_height(): return
+            parent.height += dy
+            child, parent = parent, parent.parent
+        if dy: parent.height += dy
+
+    def skips_contents(self) -> bool:
+        if not isinstance(self.node, Element): return False
+        match self.node.style.get("content-visibility", "visible"):
+            case "hidden":
+                return True
+            case "auto":
+                viewport_bottom = self.document.scroll + self.document.dimensions["height"]
+                return self.y > viewport_bottom + CONTENT_VISIBILITY_MARGIN_PX
+            case _:
+                return False
+
     def layout_mode(self) -> Literal["inline", "block"]:
         if isinstance(self.node, list):
             return "inline"
@@ -215,8 +303,8 @@ class BlockLayout(Layout):
                     if "toc" == self.node.attributes.get("id"):
                         text = " Table of Contents "
                         font = get_font("", 12, "normal", "roman")
-                        y1 = self.y - self.dimensions["vstep"]
-                        x2, y2 = self.x + font.measureText(text), y1 + linespace(font)
+                        y1 = self.y - self.document.dimensions["vstep"]
+                        x2, y2 = self.x + measure_text(font, text), y1 + linespace(font)
                         rect = DrawRect(skia.Rect.MakeLTRB(self.x, y1, x2, y2), "grey", layout=self)
                         cmds.append(rect)
                         cmds.append(DrawText(self.x, y1, text, font, "black", layout=self))
@@ -226,7 +314,7 @@ class BlockLayout(Layout):
                         cmds.append(rect)
                 case "li":
                     size = 4
-                    x = self.x - self.dimensions["hstep"] + size // 2
+                    x = self.x - self.document.dimensions["hstep"] + size // 2
                     y = self.y + self.height // 2 - size // 2
                     rect = DrawRect(skia.Rect.MakeXYWH(x, y, size, size), "black", layout=self) 
                     cmds.append(rect)
@@ -261,11 +349,14 @@ class BlockLayout(Layout):
             for word in node.text.split():
                 self.word(node, word)
         else:
-            if node.tag == "br":
+            if node.style.get("display") == "none":
+                return
+            elif node.tag == "br":
                 self.new_line()
             elif node.tag in ["input", "button"]:
                 self.input(node)
             else:
+                self.document.index(node, self.children[-1])
                 for child in node.children:
                     self.recurse(child)
 
@@ -296,7 +387,7 @@ class BlockLayout(Layout):
                 return
         # ---
         font = get_font(family, size, weight, style)
-        w  = font.measureText(word)
+        w  = measure_text(font, word)
         # Auto line breaks
         if self.cursor_x + w > self.width:
             # Soft hyphens support
@@ -307,25 +398,27 @@ class BlockLayout(Layout):
                     seq, r = seq.rsplit("\N{soft hyphen}", 1)
                     if remainder: remainder = "\N{soft hyphen}" + remainder # To save \N position
                     remainder = r + remainder
-                    seq_w = font.measureText(seq + "-")
+                    seq_w = measure_text(font, seq + "-")
                     if self.cursor_x + seq_w > self.width: continue
                     seq += "-" # Adds hyphen at separation point
                     line: LineLayout = self.children[-1] # type: ignore
                     previous_word = line.children[-1] if line.children else None
                     new_text = TextLayout(node, seq, line, previous_word)
                     line.children.append(new_text)
+                    self.document.index(node, new_text)
                     self.new_line()
                     word = seq = remainder
                     remainder = ""
-                    w = font.measureText(word)
+                    w = measure_text(font, word)
             else:
                 self.new_line()
         line: LineLayout = self.children[-1] # type: ignore
         previous_word = line.children[-1] if line.children else None
         text = TextLayout(node, word, line, previous_word)
         line.children.append(text)
+        self.document.index(node, text)
         self.cursor_x += w
-        if node.style["white-space"] != "pre": self.cursor_x += font.measureText(" ")
+        if node.style["white-space"] != "pre": self.cursor_x += measure_text(font, " ")
 
     def new_line(self) -> None:
         self.cursor_x = 0
@@ -342,6 +435,7 @@ class BlockLayout(Layout):
         previous_word: TextLayout | InputLayout | None = line.children[-1] if line.children else None
         input = InputLayout(node, line, previous_word)
         line.children.append(input)
+        self.document.index(node, input)
                 # Prop type checking
         weight: Literal["bold", "normal"]
         if node.style["font-weight"] in ["bold", "normal"]: weight = node.style["font-weight"] # type: ignore
@@ -357,12 +451,14 @@ class BlockLayout(Layout):
         except: size = 12
         # ---
         font = get_font(family, size, weight, style)
-        self.cursor_x += w + font.measureText(" ")
+        self.cursor_x += w + measure_text(font, " ")
 
     def self_rect(self) -> skia.Rect:
         return skia.Rect.MakeXYWH(self.x, self.y, self.width, self.height)
 
 class LineLayout(Layout):
+    __slots__ = ("previous",)
+
     def __init__(self, \
     node: Text, \
     parent: BlockLayout, \
@@ -404,14 +500,14 @@ class LineLayout(Layout):
         for word in self.children:
             word.x += text_padding
         # ---
-        max_ascent = max([(-word.font.getMetrics().fAscent) for word in self.children])
+        max_ascent = max([(-get_metrics(word.font).fAscent) for word in self.children])
         baseline = int(self.y + 1.25 * max_ascent)
         for child in self.children:
-            child.y = baseline + child.font.getMetrics().fAscent
+            child.y = baseline + get_metrics(child.font).fAscent
             if not isinstance(child, TextLayout): continue
-            if child.node.style["vertical-align"] == "top": child.y += child.font.getMetrics().fAscent # vertical-align: top
+            if child.node.style["vertical-align"] == "top": child.y += get_metrics(child.font).fAscent # vertical-align: top
             if "\N{soft hyphen}" in child.word: child.word = child.word.replace("\N{soft hyphen}", "") # Removes visible soft hyphen 
-        max_descent = max([word.font.getMetrics().fDescent for word in self.children])
+        max_descent = max([get_metrics(word.font).fDescent for word in self.children])
         self.height = int(1.25 * (max_ascent + max_descent))
 
     def paint(self) -> list:
@@ -427,6 +523,8 @@ class LineLayout(Layout):
         return skia.Rect.MakeXYWH(self.x, self.y, self.width, self.height)
 
 class TextLayout(Layout):
+    __slots__ = ("word", "previous", "no_space", "font")
+
     def __init__(self, \
     node: Text, \
     word: str, \
@@ -436,12 +534,13 @@ class TextLayout(Layout):
         self.word: str = word
         self.parent: LineLayout = parent
         self.previous: TextLayout | InputLayout | None = previous
-        self.children: list[Layout] = []
+        self.children: tuple = NO_CHILDREN
         # ---
         self.x: int
         self.y: int
-        self.width: int
+        self.width: float
         self.height: int
+        self.font: skia.Font
         # ---
         self.no_space: bool = self.node.style["white-space"] == "pre"
 
@@ -467,9 +566,9 @@ class TextLayout(Layout):
             self.word = self.word.upper()
             size = int(size * .75)
         self.font = get_font(family, size, weight, style)
-        self.width = self.font.measureText(self.word)
+        self.width = measure_text(self.font, self.word)
         if self.previous:
-            space = self.previous.font.measureText(" ") if not self.no_space else 0
+            space = measure_text(self.previous.font, " ") if not self.no_space else 0
             self.x = self.previous.x + space + self.previous.width
         else:
             self.x = self.parent.x
@@ -489,6 +588,8 @@ class TextLayout(Layout):
         return skia.Rect.MakeXYWH(self.x, self.y, self.width, self.height)
 
 class InputLayout(Layout):
+    __slots__ = ("previous", "type", "font")
+
     def __init__(self, \
     node: Element, \
     parent: LineLayout, \
@@ -496,7 +597,7 @@ class InputLayout(Layout):
         self.node: Element = node
         self.parent: LineLayout = parent
         self.previous: TextLayout | InputLayout | None = previous
-        self.children: list[Layout] = []
+        self.children: tuple = NO_CHILDREN
         # Support only for types: text, checkbox, hidden, password, button
         self.type = self.node.attributes.get("type", "text")
         if self.node.tag == "button": self.type = "button"
@@ -506,6 +607,7 @@ class InputLayout(Layout):
         self.y: int
         self.width: int
         self.height: int
+        self.font: skia.Font
 
     def __repr__(self) -> str:
         return "InputLayout ({})".format(self.type)
@@ -534,7 +636,7 @@ class InputLayout(Layout):
        
         # Sizes
         if self.previous:
-            space = self.previous.font.measureText(" ")
+            space = measure_text(self.previous.font, " ")
             self.x = self.previous.x + space + self.previous.width
         else:
             self.x = self.parent.x
@@ -551,7 +653,7 @@ class InputLayout(Layout):
             if self.type == "password":
                 text = "*" * len(text)
             if self.node.is_focused:
-                cx = self.x + self.font.measureText(text)
+                cx = self.x + measure_text(self.font, text)
                 cmds.append(DrawLine(cx, self.y, cx, self.y + self.height, "black", 1, layout=self))
             color = self.node.style['color']
             cmds.append(DrawText(self.x, self.y, text, self.font, color, layout=self))
@@ -586,6 +688,9 @@ size: int,
 weight: Literal['normal', 'bold'], 
 style: Literal['roman', 'italic']
 ) -> skia.Font:
+    sized_key = (weight, style, size)
+    if sized_key in SIZED_FONTS:
+        return SIZED_FONTS[sized_key]
     key = (weight, style)
     if key not in FONTS:
         if weight == "bold":
@@ -600,7 +705,19 @@ style: Literal['roman', 'italic']
         style_info = skia.FontStyle(skia_weight, skia_width, skia_style)
         font = skia.Typeface(family, style_info)
         FONTS[key] = font
-    return skia.Font(FONTS[key], size)
+    SIZED_FONTS[sized_key] = skia.Font(FONTS[key], size)
+    return SIZED_FONTS[sized_key]
+
+def shift_layout(layout: Layout, dy: float) -> None:
+    layout.y += dy # type: ignore
+    for child in layout.children:
+        shift_layout(child, dy)
+
+def intrinsic_height(node: Element) -> int:
+    height = node.style.get("contain-intrinsic-height", "none").removeprefix("auto").strip()
+    if not height.endswith("px"): return 0
+    try: return int(float(height[:-2]))
+    except: return 0
 
 def split_small_caps(text: str) -> list[str]:
     out: list[str] = []
@@ -616,8 +733,29 @@ def split_small_caps(text: str) -> list[str]:
     if buffer: out.append(buffer)
     return out
 
+def measurements(font: skia.Font) -> tuple[skia.FontMetrics, dict[str, float]]:
+    entry = MEASUREMENTS.get(id(font))
+    if entry is None:
+        # Keeps font referenced, so its id cannot be reused by another font
+        entry = MEASUREMENTS[id(font)] = (font, font.getMetrics(), {})
+    return entry[1], entry[2]
+
+def measure_text(font: skia.Font, text: str) -> float:
+    _, widths = measurements(font)
+    # Read once, so other thread clearing cache between check and read does not matter
+    width = widths.get(text)
+    if width is None:
+        if len(widths) > MAX_CACHED_WIDTHS: widths.clear()
+        width = font.measureText(text)
+        widths[text] = width
+    return width
+
+def get_metrics(font: skia.Font) -> skia.FontMetrics:
+    metrics, _ = measurements(font)
+    return metrics
+
 def linespace(font: skia.Font) -> int:
-    metrics = font.getMetrics()
+    metrics = get_metrics(font)
     return metrics.fDescent - metrics.fAscent
 
 def paint_visual_effects(
@@ -0,0 +1,32 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+class NetworkLoop:
+    # Requests run as coroutines on one thread, so concurrent fetches do not need own threads
+    def __init__(self) -> None:
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        # Daemon thread does not keep browser open, when request is stuck
+        self.thread: threading.Thread = threading.Thread(target=self.run_forever, name="network", daemon=True)
+        self.thread.start()
+
+    def run_forever(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine: Coroutine[Any, Any, T]) -> Future[T]:
+        # Can be called from any thread, result is waited on or handled with callback
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        # Blocks calling thread until coroutine is done, network thread itself would deadlock
+        assert threading.current_thread() is not self.thread
+        return self.submit(coroutine).result()
+
+    def close(self) -> None:
+        if not self.thread.is_alive(): return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1)
@@ -9,7 +9,9 @@ STORAGE_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 class Storage:
     def __init__(self) -> None:
-        self.con = sqlite3.connect(STORAGE_PATH)
+        # Urls are created on browser thread and loaded on tab threads,
+        # sqlite is built serialized, so connection can be shared between them
+        self.con = sqlite3.connect(STORAGE_PATH, check_same_thread=False)
         cursor = self.con.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS history (
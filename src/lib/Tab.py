@@ -1,16 +1,20 @@
+import math
 import skia
 import urllib.parse
 from pathlib import Path
+from concurrent.futures import Future
 from .URL import URL
 from . import BASE_DIR
 from .JSContext import JSContext
-from .Layout import DocumentLayout, Layout
-from .Draw import Blend, Draw, DrawRRect, DrawRect
+from .Layout import DocumentLayout, Dimensions, Layout
+from .Draw import Blend, Draw, DrawRRect, damage
+from .TaskRunner import Task, TaskRunner
+from .Trace import span, traced
 from .CSSParser import CSS_rule, CSSParser, style, cascade_priority
 from .HTMLParser import HTMLParser, HTMLSourceParser, Element, Text
 
 SCROLL_STEP = 50
-SCROLLBAR_OFFSET = 2
+HIT_GRID_CELL_PX = 128
 
 # Default style sheets
 DEFAULT_STYLE_SHEET_PATH = Path(BASE_DIR) / "assets" / "css" /  "browser.css"
@@ -19,39 +23,92 @@ try: ss = open(DEFAULT_STYLE_SHEET_PATH).read()
 except: print("Could not find default style sheets file")
 DEFAULT_STYLE_SHEET = CSSParser(ss).parse()
 
+class CommitData:
+    def __init__(self, 
+    url: URL, 
+    scroll: float | None, 
+    height: float, 
+    display_list: list[Draw], 
+    previous_display_list: list[Draw],
+    damage: list[skia.Rect],
+    title: str | None,
+    can_back: bool,
+    can_forward: bool,
+    bookmarked: bool,
+    ) -> None:
+        self.url: URL = url
+        # None if browser scroll should be kept
+        self.scroll: float | None = scroll
+        self.height: float = height
+        self.display_list: list[Draw] = display_list
+        # Damage is relative to previous commit, browser uses it only if it still shows that one
+        self.previous_display_list: list[Draw] = previous_display_list
+        self.damage: list[skia.Rect] = damage
+        self.title: str | None = title
+        self.can_back: bool = can_back
+        self.can_forward: bool = can_forward
+        self.bookmarked: bool = bookmarked
+
 class Tab:
     def __init__(self, browser) -> None:
         from .Browser import Browser
         assert isinstance(browser, Browser)
         self.browser: Browser = browser
+        # Own copy, because browser resizes while tab is laying out
+        self.dimensions: Dimensions = browser.dimensions.copy()
         self.url: URL = URL("about:blank")
         self.js: JSContext
         self.display_list: list[Draw] = []
+        self.committed_display_list: list[Draw] = []
+        self.hit_grid: HitGrid | None = None
         self.scroll = 0
         self.history: list[URL] = []
         self.forward_history: list[URL] = []
+        # Kept in memory, so storage is queried only on navigation
+        self.bookmarked: bool = False
         self.focus: Element | None = None
         self.allowed_origins: list[str] | None = None
+        # Subresource requests started before they are needed
+        self.fetches: dict[str, tuple[URL, Future[tuple[dict[str, str], str]]]] = {}
         self.nodes: Element = Element("html", {}, None)
         self.rules: list[CSS_rule] = DEFAULT_STYLE_SHEET.copy()
+        # Changes are only marked, rendering runs once per frame
+        self.needs_style: bool = False
+        self.needs_layout: bool = False
+        # Skipped content near viewport is laid out, without layout of whole document
+        self.needs_reveal: bool = False
+        self.render_scheduled: bool = False
+        # Browser thread scrolls on its own, until tab sends scroll it has set
+        self.scroll_changed_in_tab: bool = False
+        # Loading, scripts and rendering run on tab thread, browser thread only schedules them
+        self.task_runner: TaskRunner = TaskRunner()
         
     # --- Event handlers
-    def up(self) -> None:
-        self.scroll = max(self.scroll - SCROLL_STEP, 0)
-
-    def down(self) -> None:
-        self.scroll = min(self.scroll + SCROLL_STEP, self.display_height())
-
-    def scrollwheel(self, delta: int) -> None:
-        delta *= -SCROLL_STEP # Adjusts direction and distance
-        if delta < 0: self.scroll = max(self.scroll + delta, 0)
-        else: self.scroll = min(self.scroll + delta, self.display_height())
-
-    def configure(self) -> None:
-        self.render()
-
-    def middle_click(self, x: int, y: int) -> URL | None:
-        y += self.scroll
+    # Called as tasks on tab thread, positions are in document coordinates,
+    # because tab scroll can be behind browser scroll
+    def set_scroll(self, scroll: float) -> None:
+        if self.scroll_changed_in_tab: return
+        self.scroll = scroll
+        # Lays out content skipped by `content-visibility` once it is near viewport
+        if hasattr(self, "document") and self.document.needs_layout(self.scroll):
+            self.set_needs_reveal()
+
+    def configure(self, dimensions: Dimensions) -> None:
+        width_changed = self.dimensions["width"] != dimensions["width"]
+        # Updated in place, because document keeps same dimensions
+        self.dimensions.update(dimensions)
+        # Styles do not depend on viewport size, so only layout is rerun
+        if width_changed: self.set_needs_layout()
+        # Taller viewport can show content skipped by `content-visibility`
+        elif hasattr(self, "document") and self.document.needs_layout(self.scroll):
+            self.set_needs_reveal()
+
+    def activate(self) -> None:
+        # Sends whole state again, to browser which has switched to this tab
+        self.scroll_changed_in_tab = True
+        self.schedule_render()
+
+    def middle_click(self, x: int, y: int) -> None:
         objs = self.hit_objects(x, y)
         if not objs: return
         elt: Element | Text | None = objs[-1].node if not isinstance(objs[-1].node, list) else objs[-1].node[-1]
@@ -60,12 +117,11 @@ class Tab:
             if isinstance(elt, Text):
                 pass
             elif elt.tag == "a" and "href" in elt.attributes:
-                return self.url.resolve(elt.attributes["href"])
+                self.browser.new_tab(self.url.resolve(elt.attributes["href"]))
+                return
             elt = elt.parent
-        return None     
 
     def click(self, x: int, y: int) -> None:
-        y += self.scroll
         objs = self.hit_objects(x, y)
         if not objs: return
         elt: Element | Text | None = objs[-1].node if not isinstance(objs[-1].node, list) else objs[-1].node[-1]
@@ -80,10 +136,7 @@ class Tab:
                 href = elt.attributes["href"]
                 if href.startswith("#"): # Fragment link support
                     self.url.fragment = href[1:]
-                    node = find_node_by_id(self.url.fragment, self.document)
-                    if node is not None: 
-                        self.scroll = node.y
-                        self.scrollwheel(0) # Prevents overscroll
+                    self.scroll_to_fragment(self.url.fragment)
                 else:
                     url = self.url.resolve(href)
                     self.clear_forward()
@@ -100,7 +153,7 @@ class Tab:
                     elt.attributes["value"] = ""
                     self.focus = elt
                     elt.is_focused = True
-                self.render()
+                self.set_needs_render()
                 return
             elif elt.tag == "button":
                 if self.js.dispatch_event("click", elt): return
@@ -110,13 +163,13 @@ class Tab:
                     elt = elt.parent
                 if not elt: break
             elt = elt.parent
-        self.render()
+        self.set_needs_render()
 
     def keypress(self, char: str) -> bool:
         if self.focus:
             if self.js.dispatch_event("keydown", self.focus): return True
             self.focus.attributes["value"] += char
-            self.render()
+            self.set_needs_render()
             return True
         return False
 
@@ -138,57 +191,30 @@ class Tab:
             if not text: return False
             text = text[:-1]
             self.focus.attributes["value"] = text
-            self.render()
+            self.set_needs_render()
             return True
         return False
 
     # --- Functions
     def hit_objects(self, x: int, y: int) -> list[Layout]:
+        # Index is built on first hit test after paint
+        if self.hit_grid is None:
+            self.hit_grid = HitGrid(self.display_list)
         objs: list[Layout] = []
-        for obj in flatten_display_list(self.display_list):
-            if object_hit(obj, x, y): 
-                assert obj.layout is not None
-                objs.append(obj.layout)
+        for obj in self.hit_grid.query(x, y):
+            assert obj.layout is not None
+            objs.append(obj.layout)
         return objs
 
     def display_height(self) -> int:
         h = (
             self.document.height 
-            - self.browser.dimensions["height"] 
+            - self.dimensions["height"] 
             + self.browser.chrome.bottom
-            + self.browser.dimensions["vstep"] * 2
+            + self.dimensions["vstep"] * 2
         )
         return max(0, h)
 
-    def raster(self, canvas: skia.Canvas) -> None:
-        for cmd in self.display_list:
-            cmd.execute(canvas)
-        self.raster_scrollbar(canvas)
-
-    def raster_scrollbar(self, canvas: skia.Canvas) -> None:
-        dh = self.display_height()
-        # Bg
-        sb_rect = skia.Rect.MakeXYWH(
-            self.browser.dimensions['width'] - self.browser.dimensions["hstep"], self.scroll,
-            self.browser.dimensions["hstep"], dh
-        )
-        if dh > 0:
-            DrawRect(sb_rect, "lightgrey").execute(canvas)
-            ratio = int(
-                (self.scroll / dh) 
-                * (self.browser.dimensions["height"] - self.browser.chrome.bottom - self.browser.dimensions["vstep"])
-            )
-            scrollbar_rect = skia.Rect.MakeXYWH(
-                sb_rect.left() + SCROLLBAR_OFFSET,
-                ratio + SCROLLBAR_OFFSET + self.scroll,
-                self.browser.dimensions["hstep"] - SCROLLBAR_OFFSET*2,
-                self.browser.dimensions["vstep"] - SCROLLBAR_OFFSET*2
-            )
-            DrawRRect(scrollbar_rect, 3, "grey").execute(canvas)
-        else:
-            DrawRect(sb_rect, "white").execute(canvas)
-
-
     def submit_form(self, elt: Element) -> None:
         inputs = [node for node in tree_to_list(elt, [])
             if isinstance(node, Element)
@@ -217,26 +243,40 @@ class Tab:
         if self.js.dispatch_event("submit", elt): return
         self.load(url, body)
 
+    @traced("load", "tab")
     def load(self, url: URL, payload: str | None = None) -> None:
         self.browser.set_cursor("LOADING")
+        self.cancel_fetches()
         if self.focus: self.focus.is_focused = False
         self.focus = None
         self.scroll = 0
+        self.scroll_changed_in_tab = True
         self.history.append(url)
         url.storage.add_history(str(url))
-        headers, body = url.request(self.url, payload)
-        self.allowed_origins = None
-        if "content-security-policy" in headers:
-            csp = headers["content-security-policy"].split()
-            if len(csp) > 0 and csp[0] == "default-src":
-                self.allowed_origins = []
-                for origin in csp[1:]:
-                    self.allowed_origins.append(URL(origin).origin())
-        if url.view_source:
-            self.nodes = HTMLSourceParser(body).source()
-        else:
-            self.nodes = HTMLParser(body).parse()
+        headers, chunks = url.stream(self.url, payload)
+        # Body is closed also on error, so its connection is given back to pool
+        try:
+            self.allowed_origins = None
+            if "content-security-policy" in headers:
+                csp = headers["content-security-policy"].split()
+                if len(csp) > 0 and csp[0] == "default-src":
+                    self.allowed_origins = []
+                    for origin in csp[1:]:
+                        self.allowed_origins.append(URL(origin).origin())
+            with span("parse_html", "tab"):
+                if url.view_source:
+                    self.nodes = HTMLSourceParser("".join(chunks)).source()
+                else:
+                    # Chunks are parsed as they arrive, so whole page is never held as one string
+                    parser = HTMLParser("")
+                    for chunk in chunks: parser.feed(chunk)
+                    self.nodes = parser.parse()
+        finally:
+            chunks.close()
         self.url = url
+        self.bookmarked = bool(url.storage.get_bookmark(str(url)))
+        # Subresources are downloaded at once, while scripts run
+        self.prefetch(self.subresources(self.nodes))
         # Propagating attributes
         self.propagate_attributes(self.nodes)  
         # Executing JavaScript
@@ -245,36 +285,125 @@ class Tab:
         # Parsing style sheets
         self.load_sheets()
         # Rendering
+        self.set_needs_render()
         self.render()
         # Fragment handling
         if self.url.fragment:
-            node = find_node_by_id(self.url.fragment, self.document)
-            if node is not None: 
-                self.scroll = node.y
-                self.scrollwheel(0) # Prevents overscroll
+            self.scroll_to_fragment(self.url.fragment)
         # SSL error handling
         if 'x-ssl-error' in headers:
-            self.browser.show_simple_messagebox(
+            self.browser.post_messagebox(
                 "ERROR", 
                 'SSL error', 
                 'This connection is not secure!\nPage is not loaded, because SSL certificate error ocurred:\n\n{}'.format(headers["x-ssl-error"]),
             )
-        # Update window title
-        self.browser.update_title()
         self.browser.set_cursor("DEFAULT")
 
+    def schedule_task(self, task_code, *args) -> None:
+        self.task_runner.schedule_task(Task(task_code, *args))
+
+    def set_needs_render(self) -> None:
+        self.needs_style = True
+        self.schedule_render()
+
+    def set_needs_layout(self) -> None:
+        self.needs_layout = True
+        self.schedule_render()
+
+    def set_needs_reveal(self) -> None:
+        self.needs_reveal = True
+        self.schedule_render()
+
+    def schedule_render(self) -> None:
+        # Changes of one task are rendered and committed together, after it ends
+        if self.render_scheduled: return
+        self.render_scheduled = True
+        self.schedule_task(self.run_render)
+
+    def run_render(self) -> None:
+        self.render_scheduled = False
+        self.render()
+        self.commit()
+
+    def commit(self) -> None:
+        # Hands rendered state over to browser thread, which rasters and scrolls it
+        if not hasattr(self, "document"): return
+        scroll = self.scroll if self.scroll_changed_in_tab else None
+        self.scroll_changed_in_tab = False
+        previous = self.committed_display_list
+        damage_rects: list[skia.Rect] = []
+        if previous is not self.display_list:
+            with span("diff_display_list", "tab"):
+                damage_rects = damage(previous, self.display_list)
+        self.committed_display_list = self.display_list
+        self.browser.commit(self, CommitData(
+            url=self.url,
+            scroll=scroll,
+            height=self.document.height,
+            display_list=self.display_list,
+            previous_display_list=previous,
+            damage=damage_rects,
+            title=self.page_title(),
+            can_back=self.can_back(),
+            can_forward=self.can_forward(),
+            bookmarked=self.bookmarked,
+        ))
+
     def render(self) -> None:
-        style(self.nodes, sorted(self.rules, key=cascade_priority))
-        self.document = DocumentLayout(self.nodes, self.browser.dimensions)
-        self.document.layout()
+        # Runs only steps, that are outdated since last frame
+        if self.needs_style:
+            with span("style", "tab"):
+                style(self.nodes, sorted(self.rules, key=cascade_priority))
+            self.needs_style = False
+            self.needs_layout = True
+        if self.needs_layout:
+            self.layout()
+        elif self.needs_reveal:
+            self.reveal()
+
+    def layout(self) -> None:
+        self.document = DocumentLayout(self.nodes, self.dimensions, self.scroll)
+        with span("layout", "tab"):
+            self.document.layout()
+        self.paint()
+        self.needs_layout = False
+        self.needs_reveal = False
+
+    def reveal(self) -> None:
+        # Lays out only skipped blocks, that came near viewport
+        with span("reveal", "tab"):
+            self.document.reveal(self.scroll)
+        self.paint()
+        self.needs_reveal = False
+
+    def paint(self) -> None:
         self.display_list = []
-        paint_tree(self.document, self.display_list)
+        with span("paint_tree", "tab"):
+            paint_tree(self.document, self.display_list)
+        self.hit_grid = None
+
+    def scroll_to_fragment(self, fragment: str) -> None:
+        self.render() # Target position needs current layout
+        node = find_node_by_id(fragment, self.document)
+        if node is None:
+            # Target may be inside content skipped by `content-visibility`
+            for block in self.document.skipped:
+                if find_element_by_id(fragment, block.node) is not None: # type: ignore
+                    self.scroll = block.y
+                    self.reveal()
+                    node = find_node_by_id(fragment, self.document)
+                    break
+        if node is not None: 
+            self.scroll = min(node.y, self.display_height()) # Prevents overscroll
+            self.scroll_changed_in_tab = True
+            if self.document.needs_layout(self.scroll): self.needs_reveal = True
+            self.schedule_render()
 
     def blur(self) -> None:
         if not self.focus: return
         self.focus.is_focused = False
         self.focus = None
-        self.render()
+        self.set_needs_render()
 
     def propagate_attributes(self, nodes: Element | Text) -> None:
         if isinstance(nodes, Text): return
@@ -298,14 +427,18 @@ class Tab:
             and node.tag == "script"
             and "src" in node.attributes
         ]
+        script_urls: list[tuple[str, URL]] = []
         for script in scripts:
             script_url = self.url.resolve(script)
             if not self.allowed_request(script_url):
                 print("Blocked script", script, "due to csp")
                 continue
-            try: headers, body = script_url.request(self.url)
-            except: continue
-            if not script_url.is_valid: continue
+            script_urls.append((script, script_url))
+        # Scripts are downloaded in parallel, but run in document order
+        self.prefetch([script_url for _, script_url in script_urls])
+        for script, script_url in script_urls:
+            body = self.fetch(script_url)
+            if body is None: continue
             self.js.run(script, body)
 
     def load_sheets(self) -> None:
@@ -318,23 +451,70 @@ class Tab:
                     and "href" in node.attributes
                 ) or (node.tag == "style")
         )]
+        sheet_urls: dict[Element, URL] = {}
+        for sheet in sheets:
+            if sheet.tag != "link": continue
+            sheet_url = self.url.resolve(sheet.attributes["href"])
+            if not self.allowed_request(sheet_url):
+                print("Blocked stylesheet", sheet.attributes["href"], "due to csp")
+                continue
+            if not sheet_url.is_valid: continue
+            sheet_urls[sheet] = sheet_url
+        # Sheets are downloaded in parallel, but applied in cascade order
+        self.prefetch(list(sheet_urls.values()))
         for sheet in sheets:
             body = ""
             if sheet.tag == "link":
-                sheet_url = self.url.resolve(sheet.attributes["href"])
-                if not self.allowed_request(sheet_url):
-                    print("Blocked stylesheet", sheet.attributes["href"], "due to csp")
-                    continue
-                if not sheet_url.is_valid: continue
-                try: headers, body = sheet_url.request(self.url)
-                except: continue
+                if sheet not in sheet_urls: continue
+                fetched = self.fetch(sheet_urls[sheet])
+                if fetched is None: continue
+                body = fetched
             elif sheet.tag == "style":
                 for child in sheet.children:
                     if isinstance(child, Text):
                         body += child.text
             
-            self.rules.extend(CSSParser(body).parse())
-    
+            with span("parse_css", "tab"):
+                self.rules.extend(CSSParser(body).parse())
+
+    def subresources(self, nodes: Element) -> list[URL]:
+        # Scripts and linked sheets, that are allowed to be requested
+        urls: list[URL] = []
+        for node in tree_to_list(nodes, []):
+            if not isinstance(node, Element): continue
+            if node.tag == "script" and "src" in node.attributes:
+                url = self.url.resolve(node.attributes["src"])
+            elif node.tag == "link" and node.attributes.get("rel") == "stylesheet" and "href" in node.attributes:
+                url = self.url.resolve(node.attributes["href"])
+            else: continue
+            if url.is_valid and self.allowed_request(url): urls.append(url)
+        return urls
+
+    def prefetch(self, urls: list[URL]) -> None:
+        # Starts requests on network loop, results are taken later by `fetch`
+        for url in urls:
+            if str(url) in self.fetches: continue
+            self.fetches[str(url)] = (url, url.request_future(self.url))
+
+    def cancel_fetches(self) -> None:
+        # Unused requests of previous page are stopped, so their connections are given back to pool
+        for _, future in self.fetches.values(): future.cancel()
+        self.fetches = {}
+
+    def fetch(self, url: URL) -> str | None:
+        # Returns body of prefetched or new request, None if request failed
+        prefetched = self.fetches.pop(str(url), None)
+        try:
+            if prefetched is None:
+                headers, body = url.request(self.url)
+            else:
+                url, future = prefetched
+                with span("wait_fetch", "network", url=url):
+                    headers, body = future.result()
+        except: return None
+        if not url.is_valid: return None
+        return body
+
     def allowed_request(self, url: URL) -> bool:
         return self.allowed_origins == None \
         or url.origin() in self.allowed_origins
@@ -347,52 +527,64 @@ class Tab:
 
     def go_back(self) -> None:
         if not self.can_back(): return
-        # Resubmitting form alert
+        # Resubmitting form alert, answer comes back from browser thread as new task
         if self.history[-2].method == "POST":
-            action = self.browser.show_yesno_messagebox(
+            self.browser.post_messagebox(
                 'WARNING',
                 'Resubmit form?',
-                'Are you sure you want to resubmit form?'
+                'Are you sure you want to resubmit form?',
+                self,
+                self.resubmit_back,
             )
-            if not action: return
-            forward = self.history.pop()
-            self.forward_history.append(forward)
-            back = self.history.pop()
-            self.load(back, back.payload)
         else:
             forward = self.history.pop()
             self.forward_history.append(forward)
             back = self.history.pop()
             self.load(back)
 
+    def resubmit_back(self, action: bool) -> None:
+        # History could change, while message box was open
+        if not action or not self.can_back() or self.history[-2].method != "POST": return
+        forward = self.history.pop()
+        self.forward_history.append(forward)
+        back = self.history.pop()
+        self.load(back, back.payload)
+
     def go_forward(self) -> None:
         if not self.can_forward(): return
-        # Resubmitting form alert
+        # Resubmitting form alert, answer comes back from browser thread as new task
         if self.forward_history[-1].method == "POST":
-            action = self.browser.show_yesno_messagebox(
+            self.browser.post_messagebox(
                 'WARNING',
                 'Resubmit form?',
-                'Are you sure you want to resubmit form?'
+                'Are you sure you want to resubmit form?',
+                self,
+                self.resubmit_forward,
             )
-            if not action: return
-            forward = self.forward_history.pop()
-            self.load(forward, forward.payload)
         else:
             forward = self.forward_history.pop()
             self.load(forward)
 
+    def resubmit_forward(self, action: bool) -> None:
+        if not action or not self.can_forward() or self.forward_history[-1].method != "POST": return
+        forward = self.forward_history.pop()
+        self.load(forward, forward.payload)
+
     def clear_forward(self) -> None:
         self.forward_history.clear()
+        self.schedule_render() # Commits history change
 
     def refresh(self) -> None:
         self.load(self.url)
         self.history.pop()
 
     def toggle_bookmark(self) -> None:
-        if self.url.storage.get_bookmark(str(self.url)):
+        if self.bookmarked:
             self.url.storage.delete_bookmark(str(self.url))
         else:
             self.url.storage.add_bookmark(str(self.url))
+        self.bookmarked = not self.bookmarked
+        self.schedule_render() # Commits bookmark change
     
     def page_title(self) -> str | None:
         if not hasattr(self, "document"): return None
@@ -430,11 +622,15 @@ def paint_tree(layout_object: Layout, display_list: list[Draw]) -> None:
 
 
 def find_node_by_id(id: str, root: DocumentLayout) -> Layout | None:
-    for layout in tree_to_list(root, []):
-        if isinstance(layout.node, Element) \
-        and "id" in layout.node.attributes \
-        and layout.node.attributes["id"] == id:
-            return layout
+    # Index is rebuilt on every layout, which follows changes of ids made by scripts
+    node = root.ids.get(id)
+    if node is None: return None
+    return root.layouts[node]
+
+def find_element_by_id(id: str, root: Element) -> Element | None:
+    for node in tree_to_list(root, []):
+        if isinstance(node, Element) and node.attributes.get("id") == id:
+            return node
     return None
 
 def flatten_display_list(dl: list[Draw]) -> list[Draw]:
@@ -448,6 +644,27 @@ def flatten_display_list(dl: list[Draw]) -> list[Draw]:
 
 def object_hit(obj: Draw, x: int, y: int) -> bool:
     if obj.layout is None: return False
+    if not obj.rect.contains(x, y): return False
     if isinstance(obj, DrawRRect):
         return obj.rrect.contains(skia.Rect.MakeXYWH(x, y, 0, 0))
-    return obj.rect.contains(x, y)
\ No newline at end of file
+    return obj.rect.contains(x, y)
+
+class HitGrid:
+    def __init__(self, display_list: list[Draw], cell_size: int = HIT_GRID_CELL_PX) -> None:
+        self.cell_size: int = cell_size
+        # Cells hold commands in paint order
+        self.cells: dict[tuple[int, int], list[Draw]] = {}
+        for cmd in flatten_display_list(display_list):
+            if cmd.layout is None or cmd.rect.isEmpty(): continue
+            left, right = self.cell(cmd.rect.left()), self.cell(cmd.rect.right())
+            top, bottom = self.cell(cmd.rect.top()), self.cell(cmd.rect.bottom())
+            for col in range(left, right + 1):
+                for row in range(top, bottom + 1):
+                    self.cells.setdefault((col, row), []).append(cmd)
+
+    def cell(self, value: float) -> int:
+        return math.floor(value / self.cell_size)
+
+    def query(self, x: int, y: int) -> list[Draw]:
+        cmds = self.cells.get((self.cell(x), self.cell(y)), [])
+        return [cmd for cmd in cmds if object_hit(cmd, x, y)]
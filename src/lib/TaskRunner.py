@@ -0,0 +1,48 @@
+import threading
+import traceback
+from collections import deque
+from typing import Any, Callable
+from .Trace import span
+
+class Task:
+    def __init__(self, task_code: Callable[..., Any], *args: Any) -> None:
+        self.task_code: Callable[..., Any] = task_code
+        self.args: tuple[Any, ...] = args
+        self.name: str = getattr(task_code, "__name__", "task")
+
+    def __repr__(self) -> str:
+        return "Task({})".format(self.name)
+
+    def run(self) -> None:
+        self.task_code(*self.args)
+
+class TaskRunner:
+    def __init__(self, name: str = "tab") -> None:
+        self.condition: threading.Condition = threading.Condition()
+        self.tasks: deque[Task] = deque()
+        self.needs_quit: bool = False
+        # Daemon thread does not keep browser open, when it is stuck in network request
+        self.thread: threading.Thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def schedule_task(self, task: Task) -> None:
+        with self.condition:
+            self.tasks.append(task)
+            self.condition.notify_all()
+
+    def set_needs_quit(self) -> None:
+        with self.condition:
+            self.needs_quit = True
+            self.condition.notify_all()
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.tasks and not self.needs_quit:
+                    self.condition.wait()
+                if self.needs_quit: return
+                task = self.tasks.popleft()
+            # Task runs without lock, so other threads can schedule more tasks meanwhile
+            try:
+                with span(task.name, "task"): task.run()
+            except Exception: traceback.print_exc()
@@ -0,0 +1,125 @@
+import os
+import math
+import skia
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from .Trace import span
+
+TILE_SIZE = 512
+TILE_BYTES = TILE_SIZE * TILE_SIZE * 4
+TILE_CACHE_BUDGET = 64 * 1024 * 1024
+PREFETCH_TILES = 1
+RASTER_THREADS = min(4, os.cpu_count() or 1)
+
+tile_key = tuple[int, int]
+
+class TileCache:
+    def __init__(self, budget: int = TILE_CACHE_BUDGET, threads: int = RASTER_THREADS) -> None:
+        self.budget: int = budget
+        # Least recently used tiles come first
+        self.tiles: OrderedDict[tile_key, skia.Surface] = OrderedDict()
+        self.last_top: float = 0
+        # Tiles are independent, so they are rastered concurrently
+        self.pool: ThreadPoolExecutor | None = None
+        if threads > 1:
+            self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="raster")
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+    def size(self) -> int:
+        return len(self.tiles) * TILE_BYTES
+
+    def invalidate(self) -> None:
+        self.tiles.clear()
+
+    def repaint(self, paint: Callable[[skia.Canvas], None], rects: list[skia.Rect]) -> None:
+        # Cached tiles are kept, only their changed areas are rastered again
+        dirty: dict[tile_key, skia.Rect] = {}
+        for rect in rects:
+            for key in self.keys(rect):
+                if key not in self.tiles: continue
+                col, row = key
+                area = skia.Rect.MakeLTRB(rect.left(), rect.top(), rect.right(), rect.bottom())
+                if not area.intersect(skia.Rect.MakeXYWH(col * TILE_SIZE, row * TILE_SIZE, TILE_SIZE, TILE_SIZE)): continue
+                dirty.setdefault(key, skia.Rect.MakeEmpty()).join(area)
+        if self.pool is None or len(dirty) < 2:
+            for key, area in dirty.items(): self.repaint_tile(paint, key, area)
+        else:
+            list(self.pool.map(lambda item: self.repaint_tile(paint, *item), dirty.items()))
+
+    def repaint_tile(self, paint: Callable[[skia.Canvas], None], key: tile_key, area: skia.Rect) -> None:
+        col, row = key
+        with span("repaint_tile", "raster", col=col, row=row):
+            canvas = self.tiles[key].getCanvas()
+            canvas.save()
+            canvas.translate(-col * TILE_SIZE, -row * TILE_SIZE)
+            canvas.clipRect(skia.Rect.Make(area.roundOut()))
+            canvas.clear(skia.ColorWHITE)
+            paint(canvas)
+            canvas.restore()
+
+    def keys(self, rect: skia.Rect) -> list[tile_key]:
+        if rect.isEmpty(): return []
+        return [
+            (col, row)
+            for row in range(math.floor(rect.top() / TILE_SIZE), math.ceil(rect.bottom() / TILE_SIZE))
+            for col in range(math.floor(rect.left() / TILE_SIZE), math.ceil(rect.right() / TILE_SIZE))
+        ]
+
+    def raster(self, paint: Callable[[skia.Canvas], None], viewport: skia.Rect, bounds: skia.Rect) -> None:
+        visible = skia.Rect.MakeLTRB(viewport.left(), viewport.top(), viewport.right(), viewport.bottom())
+        if not visible.intersect(bounds): visible = skia.Rect.MakeEmpty()
+        # Prefetches tiles in scroll direction
+        prefetch = TILE_SIZE * PREFETCH_TILES
+        if viewport.top() < self.last_top:
+            ahead = skia.Rect.MakeLTRB(viewport.left(), viewport.top() - prefetch, viewport.right(), viewport.top())
+        else:
+            ahead = skia.Rect.MakeLTRB(viewport.left(), viewport.bottom(), viewport.right(), viewport.bottom() + prefetch)
+        if not ahead.intersect(bounds): ahead = skia.Rect.MakeEmpty()
+        self.last_top = viewport.top()
+        # Visible tiles are used last, so they are evicted last
+        visible_keys = self.keys(visible)
+        keys = self.keys(ahead) + visible_keys
+        missing = list(dict.fromkeys(key for key in keys if key not in self.tiles))
+        rastered = dict(zip(missing, self.raster_tiles(paint, missing)))
+        for key in keys:
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+            else:
+                self.tiles[key] = rastered[key]
+        self.evict(keep=len(visible_keys))
+
+    def raster_tiles(self, paint: Callable[[skia.Canvas], None], keys: list[tile_key]) -> list[skia.Surface]:
+        if self.pool is None or len(keys) < 2:
+            return [self.raster_tile(paint, key) for key in keys]
+        return list(self.pool.map(lambda key: self.raster_tile(paint, key), keys))
+
+    def raster_tile(self, paint: Callable[[skia.Canvas], None], key: tile_key) -> skia.Surface:
+        col, row = key
+        with span("raster_tile", "raster", col=col, row=row):
+            surface = skia.Surface(TILE_SIZE, TILE_SIZE)
+            canvas = surface.getCanvas()
+            canvas.clear(skia.ColorWHITE)
+            # Canvas of tile is reused by repaint, so it is left untransformed
+            canvas.save()
+            canvas.translate(-col * TILE_SIZE, -row * TILE_SIZE)
+            paint(canvas)
+            canvas.restore()
+        return surface
+
+    def evict(self, keep: int) -> None:
+        # Most recently used tiles are never evicted, so visible ones stay
+        while self.size() > self.budget and len(self.tiles) > keep:
+            self.tiles.popitem(last=False)
+
+    def draw(self, canvas: skia.Canvas, viewport: skia.Rect) -> None:
+        for key in self.keys(viewport):
+            if key not in self.tiles: continue
+            col, row = key
+            self.tiles[key].draw(canvas, col * TILE_SIZE, row * TILE_SIZE)
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+from typing import Any, Callable, TypeVar
+
+# Events are written in batches, so tracing does not wait for file on every span
+FLUSH_EVENTS = 4096
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+class Trace:
+    # Writes Trace Event Format, opened by chrome://tracing and Perfetto
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.lock: threading.Lock = threading.Lock()
+        self.events: list[dict[str, Any]] = []
+        self.threads: set[int] = set()
+        self.pid: int = os.getpid()
+        self.start: float = time.perf_counter()
+        self.file = open(path, "w")
+        self.file.write('{"traceEvents": [\n')
+        self.first: bool = True
+        self.add({"name": "process_name", "ph": "M", "args": {"name": "StrangeBrows"}})
+
+    def timestamp(self) -> float:
+        # Microseconds since trace start
+        return (time.perf_counter() - self.start) * 1_000_000
+
+    def add(self, event: dict[str, Any]) -> None:
+        tid = threading.get_ident()
+        event["pid"] = self.pid
+        event["tid"] = tid
+        with self.lock:
+            if tid not in self.threads:
+                # Names tracks by threads, e.g. tab, raster or main
+                self.threads.add(tid)
+                self.events.append({
+                    "name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                    "args": {"name": threading.current_thread().name},
+                })
+            self.events.append(event)
+            if len(self.events) >= FLUSH_EVENTS: self.flush()
+
+    def begin(self, name: str, category: str, args: dict[str, Any] | None = None) -> None:
+        event: dict[str, Any] = {"name": name, "cat": category, "ph": "B", "ts": self.timestamp()}
+        if args: event["args"] = args
+        self.add(event)
+
+    def end(self, name: str, category: str) -> None:
+        self.add({"name": name, "cat": category, "ph": "E", "ts": self.timestamp()})
+
+    def counter(self, name: str, values: dict[str, float]) -> None:
+        self.add({"name": name, "ph": "C", "ts": self.timestamp(), "args": values})
+
+    def flush(self) -> None:
+        # Caller holds lock
+        for event in self.events:
+            if not self.first: self.file.write(",\n")
+            # Values like urls are turned into strings only here, so disabled tracing does not do it
+            self.file.write(json.dumps(event, default=str))
+            self.first = False
+        self.events.clear()
+        self.file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file.closed: return
+            self.flush()
+            self.file.write("\n]}\n")
+            self.file.close()
+
+class Span:
+    __slots__ = ("trace", "name", "category", "args")
+
+    def __init__(self, trace: Trace, name: str, category: str, args: dict[str, Any] | None) -> None:
+        self.trace: Trace = trace
+        self.name: str = name
+        self.category: str = category
+        self.args: dict[str, Any] | None = args
+
+    def __enter__(self) -> None:
+        self.trace.begin(self.name, self.category, self.args)
+
+    def __exit__(self, *exc: Any) -> None:
+        self.trace.end(self.name, self.category)
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+# Shared, so disabled tracing only costs one check per span
+NULL_SPAN = NullSpan()
+TRACE: Trace | None = None
+
+def start_trace(path: str) -> Trace:
+    global TRACE
+    stop_trace()
+    TRACE = Trace(path)
+    atexit.register(stop_trace)
+    return TRACE
+
+def stop_trace() -> None:
+    global TRACE
+    if TRACE is None: return
+    TRACE.close()
+    TRACE = None
+
+def tracing() -> bool:
+    # Guards counters, which values are costly to compute
+    return TRACE is not None
+
+def span(name: str, category: str = "browser", **args: Any) -> Span | NullSpan:
+    if TRACE is None: return NULL_SPAN
+    return Span(TRACE, name, category, args or None)
+
+def counter(name: str, **values: float) -> None:
+    if TRACE is None: return
+    TRACE.counter(name, values)
+
+def traced(name: str, category: str = "browser") -> Callable[[F], F]:
+    # Traces every call of decorated function, for functions with many returns
+    def decorator(function: F) -> F:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if TRACE is None: return function(*args, **kwargs)
+            with Span(TRACE, name, category, None):
+                return function(*args, **kwargs)
+        return wrapper # type: ignore
+    return decorator
@@ -1,23 +1,40 @@
 import atexit
-import gzip
-import socket
 import ssl
+import asyncio
 from time import time
 from pathlib import Path
+from typing import Any, AsyncIterator, Callable, TypeVar
+from concurrent.futures import Future
 from .Storage import Storage
+from .Trace import traced
+from .BodyReader import BodyReader
+from .NetworkLoop import NetworkLoop
+from .ConnectionPool import Connection, ConnectionPool
 from . import BASE_DIR, COOKIE_JAR
 from email.utils import parsedate_to_datetime
 
 DEFAULT_PAGE_PATH = Path(BASE_DIR) / "assets" / "html" / "home.html"
 BOOKMARKS_PAGE_PATH = Path(BASE_DIR) / "assets" / "html" / "bookmarks.html"
 REDIRECT_LIMIT = 20
+CONNECTION_ERROR_PAGE = "<h1>Error ocurred while connecting to host...</h1>"
+
+T = TypeVar("T")
+
+# Shared by all urls, so keep-alive connections are reused across requests and tabs
+NETWORK_LOOP = NetworkLoop()
+CONNECTION_POOL = ConnectionPool()
+
+def close_network() -> None:
+    NETWORK_LOOP.run(CONNECTION_POOL.close())
+    NETWORK_LOOP.close()
+
+atexit.register(close_network)
 
 class URL:
     def __init__(self, url: str):
         self.storage = Storage()
         self.is_valid = True
         self.redirect_count = 0
-        self.saved_sockets: dict[tuple[str, str, int], socket.socket] = {}
         self.url: str = url
         # base values
         self.method: str = "GET"
@@ -33,8 +50,6 @@ class URL:
         # data scheme specific
         self.content: str = ""
         self.type: str = ""
-        # Cleanup
-        atexit.register(self.cleanup)
         # Parsing
         if not url:
             self.is_valid = False
@@ -102,10 +117,6 @@ class URL:
             fragment_part = "#" + self.fragment
         return self.scheme + "://" + self.host + port_part + self.path + fragment_part
 
-    def cleanup(self) -> None:
-        for k, s in self.saved_sockets.items():
-            s.close()
-
     def origin(self) -> str:
         if not self.url \
         or self.url.startswith("about:") \
@@ -132,10 +143,27 @@ class URL:
         else:
             return URL(self.scheme + "://" + self.host + ":" + str(self.port) + url)
 
+    @traced("request", "network")
     def request(self, referrer: 'URL', payload: str | None = None) -> tuple[dict[str, str], str]:
-        self.method = "POST" if payload else "GET"
-        self.payload = payload
-        # Base cases
+        # Blocks only calling thread, request itself runs on network loop
+        return NETWORK_LOOP.run(self.request_async(referrer, payload))
+
+    def request_future(self, referrer: 'URL', payload: str | None = None) -> Future[tuple[dict[str, str], str]]:
+        # Does not block, so many requests can be in flight at once
+        return NETWORK_LOOP.submit(self.request_async(referrer, payload))
+
+    def stream(self, referrer: 'URL', payload: str | None = None) -> tuple[dict[str, str], 'ChunkIterator']:
+        # Body is given in chunks as they arrive, so caller can use first ones before whole body is read
+        headers, chunks = NETWORK_LOOP.run(self.open_async(referrer, payload))
+        return headers, ChunkIterator(chunks)
+
+    async def request_async(self, referrer: 'URL', payload: str | None = None) -> tuple[dict[str, str], str]:
+        headers, chunks = await self.open_async(referrer, payload)
+        content = "".join([chunk async for chunk in chunks])
+        return headers, content
+
+    def local_content(self) -> str | None:
+        # Content of urls, that are not loaded from network
         if not self.url:
             content = ""
             try: 
@@ -143,10 +171,10 @@ class URL:
                 content = file.read()
                 file.close()
             except:
-                return {}, "<h1>404 Not Found</h1>"
-            return {}, content
+                return "<h1>404 Not Found</h1>"
+            return content
         elif self.url == "about:blank":
-            return {}, ""
+            return ""
         elif self.url == "about:bookmarks":
             content = ""
             try:
@@ -154,7 +182,7 @@ class URL:
                 content = file.read()
                 file.close() 
             except:
-                return {}, "<h1>404 Not Found</h1>"
+                return "<h1>404 Not Found</h1>"
             bookmarks = []
             for url, _ in self.storage.get_all_bookmarks():
                 title = url 
@@ -162,7 +190,7 @@ class URL:
                 bookmarks.append('<li><a href="{}">{}</a></li>'.format(url, title))
             x_bookmarks = "<ul>{}</ul>".format("".join(bookmarks)) if bookmarks else '<small class="empty">There are no bookmarks!</small>'
             content = content.replace("<x-bookmarks>", x_bookmarks)
-            return {}, content
+            return content
         elif self.scheme == "file":
             content = ""
             try:
@@ -170,42 +198,25 @@ class URL:
                 content = file.read()
                 file.close()
             except:
-                return {}, "<h1>404 Not Found</h1>"
-            return {}, content
+                return "<h1>404 Not Found</h1>"
+            return content
         elif self.scheme == "data":
-            return {}, self.content
+            return self.content
+        return None
+
+    async def open_async(self, referrer: 'URL', payload: str | None = None) -> tuple[dict[str, str], AsyncIterator[str]]:
+        self.method = "POST" if payload else "GET"
+        self.payload = payload
+        # Base cases
+        # Files and storage are read on executor, so they do not block other requests on network loop
+        content = await run_blocking(self.local_content)
+        if content is not None: return {}, text_chunks(content)
         # Cache
         if self.method == "GET":
-            cached_response = self.storage.get_cache(self.url)
-            if cached_response is not None: return {}, cached_response
-        # Socket
-        s: socket.socket
-        socket_key = (self.scheme, self.host, self.port)
-        if socket_key in self.saved_sockets and self.saved_sockets[socket_key].fileno() != -1:
-            s = self.saved_sockets[socket_key]
-        else:
-            s = socket.socket(
-                family=socket.AF_INET, 
-                type=socket.SOCK_STREAM, 
-                proto=socket.IPPROTO_TCP
-            )
-            if self.scheme == "https":
-                ctx = ssl.create_default_context()
-                s = ctx.wrap_socket(s, server_hostname=self.host)
-            self.saved_sockets[(self.scheme, self.host, self.port)] = s
-            try:
-                s.connect((self.host, self.port))
-            except (ssl.SSLCertVerificationError, ssl.SSLError) as e:
-                self.is_safe = False
-                self.is_valid = False
-                s.close()
-                self.saved_sockets.pop(socket_key)
-                return {"x-ssl-error": str(e)}, "<h1>SSL error ocurred while connecting to host...</h1>"
-            except:
-                s.close()
-                self.saved_sockets.pop(socket_key)
-                return {}, "<h1>Error ocurred while connecting to host...</h1>"
+            cached_response = await run_blocking(self.storage.get_cache, self.url)
+            if cached_response is not None: return {}, text_chunks(cached_response)
         # Request
+        # Built before connection is taken, so its errors can not keep connection from pool
         request = "{} {} HTTP/1.1\r\n".format(self.method, self.path)
         request_headers = {
             "Host": self.host,
@@ -228,7 +239,9 @@ class URL:
             allow_cookie = True
             # Handling Expires
             if "expires" in params and params["expires"] != "session":
-                expires: float = parsedate_to_datetime(params["expires"]).astimezone().timestamp()
+                # Invalid date is ignored, like in other browsers, so cookie lasts for session
+                try: expires: float = parsedate_to_datetime(params["expires"]).astimezone().timestamp()
+                except (TypeError, ValueError): expires = float("inf")
                 if expires < time():
                     allow_cookie = False
                     COOKIE_JAR.pop(self.host)
@@ -242,53 +255,41 @@ class URL:
         request += "\r\n"
         # Request payload
         if self.payload: request += self.payload
-        s.send(request.encode())
-        response = s.makefile("rb", encoding="utf-8", newline="\r\n")
-        # Response status line
-        statusline = response.readline().decode()
+        # Connection
         try:
-            version, status, explenation = statusline.split(" ", 2)
+            connection = await CONNECTION_POOL.acquire((self.scheme, self.host, self.port))
+        except (ssl.SSLCertVerificationError, ssl.SSLError) as e:
+            self.is_safe = False
+            self.is_valid = False
+            return {"x-ssl-error": str(e)}, text_chunks("<h1>SSL error ocurred while connecting to host...</h1>")
         except:
-            if socket_key in self.saved_sockets:
-                s = self.saved_sockets.pop(socket_key)
-                s.close()
-                return self.request(referrer, self.payload)
+            return {}, text_chunks(CONNECTION_ERROR_PAGE)
+        try:
+            response = await self.fetch(connection, request)
+        except TimeoutError:
+            # Host, that stopped responding, is handled like host, that can not be connected to
+            return {}, text_chunks(CONNECTION_ERROR_PAGE)
+        if response is None:
+            if connection.reused:
+                # Server has closed idle connection, so request is sent on new one
+                return await self.open_async(referrer, self.payload)
             print("Recived invalid response from '{}'...".format(self.url))
-            return {}, ""
-        status = int(status)
-        # Headers
-        response_headers: dict[str, str] = {}
-        while True:
-            line = response.readline().decode()
-            if line == "\r\n": break
-            header, value = line.split(":", 1)
-            response_headers[header.casefold()] = value.strip()
+            return {}, text_chunks("")
+        status, response_headers, body = response
+        try:
+            return await self.handle_response(referrer, status, response_headers, body)
+        except BaseException:
+            # Connection is given back, also when body was not read yet
+            await body.aclose()
+            raise
+
+    async def handle_response(self, referrer: 'URL', status: int, response_headers: dict[str, str], body: 'ResponseBody') -> tuple[dict[str, str], AsyncIterator[str]]:
         # Referrer policy
         self.referrer_policy = response_headers.get("referrer-policy", None)
         # Cookies
         if "set-cookie" in response_headers:
             cookie = response_headers["set-cookie"]
             COOKIE_JAR[self.host] = parse_cookie(cookie)
-        # Content
-        content: str
-        if "content-encoding" in response_headers and response_headers["content-encoding"] == "gzip":
-            if "transfer-encoding" in response_headers and response_headers["transfer-encoding"] == "chunked":
-                assert "content-length" not in response_headers
-                encoded_content = bytearray()
-                while True:
-                    chunk_length = int(response.readline(), 16)
-                    if chunk_length == 0: break
-                    encoded_content.extend(response.read(chunk_length))
-                    response.readline() # Pass \r\n on chunk end
-                content = gzip.decompress(encoded_content).decode()
-            else:
-                content_length = int(response_headers["content-length"])
-                encoded_content = response.read(content_length)
-                content = gzip.decompress(encoded_content).decode()
-        else:
-            content_length = int(response_headers["content-length"]) \
-                if "content-length" in response_headers else None
-            content = response.read(content_length).decode()
         # Response handling
         if 300 <= status < 400:
             self.redirect_count += 1
@@ -296,10 +297,12 @@ class URL:
                 raise Exception("Reached redirection limit")
             assert "location" in response_headers
             location: str = response_headers["location"]
-            new_url = self.resolve(location)
+            # Body of redirect is read, so its connection can be reused
+            async for _ in body: pass
+            # New url opens storage
+            new_url = await run_blocking(self.resolve, location)
             new_url.redirect_count = self.redirect_count
-            new_url.saved_sockets = self.saved_sockets
-            return new_url.request(referrer)
+            return await new_url.open_async(referrer)
         else:
             self.redirect_count = 0
         if status == 200 and "cache-control" in response_headers:
@@ -314,13 +317,127 @@ class URL:
                     age = int(response_headers["age"])
                     assert age >= 0
                 expires = int(time()) + max_age - age
-                if self.storage.get_cache(self.url):
-                    self.storage.delete_cache(self.url)
-                    self.storage.add_cache(self.url, expires, content)
-                else:
-                    self.storage.add_cache(self.url, expires, content)
-        return response_headers, content
-    
+                body.cache(self, expires)
+        return response_headers, body
+
+    def store_cache(self, expires: int, content: str) -> None:
+        if self.storage.get_cache(self.url):
+            self.storage.delete_cache(self.url)
+        self.storage.add_cache(self.url, expires, content)
+
+    async def fetch(self, connection: Connection, request: str) -> tuple[int, dict[str, str], 'ResponseBody'] | None:
+        try:
+            await connection.send(request.encode())
+            # Response status line
+            statusline = (await connection.readline()).decode()
+            version, status, explenation = statusline.split(" ", 2)
+            status = int(status)
+            # Headers
+            response_headers: dict[str, str] = {}
+            while True:
+                line = (await connection.readline()).decode()
+                if line == "\r\n": break
+                header, value = line.split(":", 1)
+                response_headers[header.casefold()] = value.strip()
+        except TimeoutError:
+            # Not retried on new connection, since host is slow and not only connection is stale
+            CONNECTION_POOL.release(connection, False)
+            raise
+        except (OSError, EOFError, ValueError):
+            CONNECTION_POOL.release(connection, False)
+            return None
+        except BaseException:
+            CONNECTION_POOL.release(connection, False)
+            raise
+        body = BodyReader(connection, status, response_headers)
+        connection_header = response_headers.get("connection", "").casefold()
+        reusable = not body.until_close \
+            and connection_header != "close" \
+            and (version == "HTTP/1.1" or connection_header == "keep-alive")
+        return status, response_headers, ResponseBody(body, reusable)
+
+class ResponseBody:
+    # Chunks of response body, connection is given back to pool, when body is read or closed
+    def __init__(self, body: BodyReader, reusable: bool) -> None:
+        self.body: BodyReader = body
+        self.reusable: bool = reusable
+        self.chunks: AsyncIterator[str] = body.chunks()
+        self.released: bool = False
+        # Content is cached, only when whole body was read
+        self.cache_url: URL | None = None
+        self.cache_expires: int = 0
+        self.content: list[str] = []
+
+    def __aiter__(self) -> 'ResponseBody':
+        return self
+
+    async def __anext__(self) -> str:
+        if self.released: raise StopAsyncIteration
+        try:
+            chunk = await anext(self.chunks)
+        except StopAsyncIteration:
+            self.release()
+            if self.cache_url is not None:
+                await run_blocking(self.cache_url.store_cache, self.cache_expires, "".join(self.content))
+            raise
+        except TimeoutError:
+            # Part of body may be already used, so error page is added after it
+            self.release()
+            return CONNECTION_ERROR_PAGE
+        except BaseException:
+            self.release()
+            raise
+        if self.cache_url is not None: self.content.append(chunk)
+        return chunk
+
+    def cache(self, url: URL, expires: int) -> None:
+        self.cache_url = url
+        self.cache_expires = expires
+
+    async def aclose(self) -> None:
+        # Unlike async generator, releases connection also when reading was not started
+        await self.chunks.aclose() # type: ignore
+        self.release()
+
+    def release(self) -> None:
+        if self.released: return
+        self.released = True
+        CONNECTION_POOL.release(self.body.connection, self.reusable and self.body.complete)
+
+async def run_blocking(function: Callable[..., T], *args: Any) -> T:
+    # Runs on default executor thread, while network loop handles other requests
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+async def text_chunks(text: str) -> AsyncIterator[str]:
+    # Content already in memory is given as one chunk
+    if text: yield text
+
+class ChunkIterator:
+    # Every chunk is awaited on network loop, while calling thread waits for it
+    def __init__(self, chunks: AsyncIterator[str]) -> None:
+        self.chunks: AsyncIterator[str] = chunks
+        self.closed: bool = False
+
+    def __iter__(self) -> 'ChunkIterator':
+        return self
+
+    def __next__(self) -> str:
+        if self.closed: raise StopIteration
+        try:
+            return NETWORK_LOOP.run(anext(self.chunks))
+        except StopAsyncIteration:
+            self.close()
+            raise StopIteration
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        # Should be called, when body is not read to its end, so connection is given back
+        if self.closed: return
+        self.closed = True
+        NETWORK_LOOP.run(self.chunks.aclose()) # type: ignore
+
 def parse_cookie(cookie: str) -> tuple[str, dict[str, str]]:
     params = {}
     if ";" in cookie:
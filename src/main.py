@@ -1,52 +1,75 @@
 #!/usr/bin/env python3
 import sys
+import math
+import time
 import sdl2
 import ctypes
 import multiprocessing
 from lib.URL import URL
 from lib.Browser import Browser
+from lib.TileCache import RASTER_THREADS
+from lib.Trace import start_trace
 
 def mainloop(browser: Browser) -> None:
     event = sdl2.SDL_Event()
+    next_frame = time.perf_counter()
     while True:
-        while sdl2.SDL_PollEvent(ctypes.byref(event)) != 0:
-            match event.type:
-                case sdl2.SDL_QUIT:
-                    browser.handle_quit()
-                    sdl2.SDL_Quit()
-                    sys.exit()
-                case sdl2.SDL_MOUSEBUTTONUP:
-                    if event.button.button == sdl2.SDL_BUTTON_MIDDLE:
-                        browser.handle_middle_click(event.button)
-                    else:
-                        browser.handle_click(event.button)
-                case sdl2.SDL_MOUSEWHEEL:
-                    browser.handle_scrollwheel(event.wheel.y)
-                case sdl2.SDL_KEYDOWN:
-                    match event.key.keysym.sym: 
-                        case sdl2.SDLK_RETURN:
-                            browser.handle_enter()
-                        case sdl2.SDLK_BACKSPACE:
-                            browser.handle_backspace()
-                        case sdl2.SDLK_DOWN:
-                            browser.handle_down()
-                        case sdl2.SDLK_UP:
-                            browser.handle_up()
-                        case sdl2.SDLK_LEFT:
-                            browser.handle_left()
-                        case sdl2.SDLK_RIGHT:
-                            browser.handle_right()
-                        case sdl2.SDLK_n: # Ctrl-N
-                            if event.key.keysym.mod & (sdl2.KMOD_LCTRL | sdl2.KMOD_RCTRL):
-                                # Handles new window
-                                p = multiprocessing.Process(target=main)
-                                p.start()
-                case sdl2.SDL_TEXTINPUT:
-                    browser.handle_key(event.text.text.decode())
-                case sdl2.SDL_WINDOWEVENT:
-                    if event.window.event == sdl2.SDL_WINDOWEVENT_RESIZED:
-                        w, h = event.window.data1, event.window.data2
-                        browser.handle_configure(w, h)
+        # Sleeps until event arrives or frame is due, so idle window uses no CPU
+        if sdl2.SDL_WaitEventTimeout(ctypes.byref(event), event_timeout(browser, next_frame)) != 0:
+            handle_event(browser, event)
+            while sdl2.SDL_PollEvent(ctypes.byref(event)) != 0:
+                handle_event(browser, event)
+        # Events since last frame are rendered together, at most once per refresh
+        now = time.perf_counter()
+        if browser.needs_frame and now >= next_frame:
+            browser.frame()
+            next_frame = now + browser.frame_interval
+
+def event_timeout(browser: Browser, next_frame: float) -> int:
+    # Milliseconds until main loop has to run without event, -1 waits only for events
+    if not browser.needs_frame: return -1
+    return max(0, math.ceil((next_frame - time.perf_counter()) * 1000))
+
+def handle_event(browser: Browser, event: sdl2.SDL_Event) -> None:
+    # Wake events from other threads need no handling, only end the wait
+    match event.type:
+        case sdl2.SDL_QUIT:
+            browser.handle_quit()
+            sdl2.SDL_Quit()
+            sys.exit()
+        case sdl2.SDL_MOUSEBUTTONUP:
+            if event.button.button == sdl2.SDL_BUTTON_MIDDLE:
+                browser.handle_middle_click(event.button)
+            else:
+                browser.handle_click(event.button)
+        case sdl2.SDL_MOUSEWHEEL:
+            browser.handle_scrollwheel(event.wheel.y)
+        case sdl2.SDL_KEYDOWN:
+            match event.key.keysym.sym: 
+                case sdl2.SDLK_RETURN:
+                    browser.handle_enter()
+                case sdl2.SDLK_BACKSPACE:
+                    browser.handle_backspace()
+                case sdl2.SDLK_DOWN:
+                    browser.handle_down()
+                case sdl2.SDLK_UP:
+                    browser.handle_up()
+                case sdl2.SDLK_LEFT:
+                    browser.handle_left()
+                case sdl2.SDLK_RIGHT:
+                    browser.handle_right()
+                case sdl2.SDLK_n: # Ctrl-N
+                    if event.key.keysym.mod & (sdl2.KMOD_LCTRL | sdl2.KMOD_RCTRL):
+                        # Handles new window
+                        p = multiprocessing.Process(target=main)
+                        p.start()
+        case sdl2.SDL_TEXTINPUT:
+            browser.handle_key(event.text.text.decode())
+        case sdl2.SDL_WINDOWEVENT:
+            if event.window.event == sdl2.SDL_WINDOWEVENT_RESIZED:
+                browser.handle_configure(event.window.data1, event.window.data2)
+            elif event.window.event == sdl2.SDL_WINDOWEVENT_EXPOSED:
+                browser.handle_expose()
 
 def main() -> None:
     from argparse import ArgumentParser
@@ -56,10 +79,16 @@ def main() -> None:
     # Argument parsing
     parser = ArgumentParser(description="Simple web browser")
     parser.add_argument("url", type=str, help="Url to visit", nargs="?", default="")
+    parser.add_argument("--raster-threads", type=int, default=RASTER_THREADS, help="Number of threads rastering tiles")
+    parser.add_argument("--trace", type=str, nargs="?", const="browser.trace.json", default=None, 
+        help="Writes trace of browser pipeline, for chrome://tracing or Perfetto")
     args = parser.parse_args()
+    if args.trace: 
+        start_trace(args.trace)
+        print("[INFO]: Tracing to {}".format(args.trace))
     # Initialization
     sdl2.SDL_Init(sdl2.SDL_INIT_EVENTS)
-    browser = Browser()
+    browser = Browser(raster_threads=args.raster_threads)
     browser.new_tab(URL(args.url))
     mainloop(browser)
 